@@ -0,0 +1,113 @@
+"""启动导入耗时基准（基于 python -X importtime）
+
+用法（在仓库根目录下）:
+    python benchmarks/import_time.py -o import_time.json
+    python benchmarks/import_time.py --compare import_time.json --threshold 1.25
+
+每个模块在独立的子进程中冷启动导入若干次，取累计导入耗时的中位数；
+--compare 与之前保存的结果对比，任一模块变慢超过阈值时以非零状态码退出。
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+
+# 入口模块：命令行、批量调度、转换器和图形界面
+DEFAULT_MODULES = ["pdf_converter", "batch_scheduler", "cli", "gui"]
+
+
+def measure_import(module, python=sys.executable):
+    """在新进程中导入模块，返回 (累计导入耗时微秒, 各模块自身耗时前10名)"""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1:] or ["未知错误"]
+        raise RuntimeError(last_line[0])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    total = next(cum for name, _, cum in rows if name == module)
+    heaviest = sorted(rows, key=lambda row: row[1], reverse=True)[:10]
+    return total, [{"module": name, "self_us": self_us} for name, self_us, _ in heaviest]
+
+
+def run_benchmark(modules, repeat):
+    results = {}
+    for module in modules:
+        try:
+            samples = []
+            heaviest = []
+            for _ in range(repeat):
+                total, heaviest = measure_import(module)
+                samples.append(total)
+            results[module] = {
+                "cumulative_us": int(statistics.median(samples)),
+                "samples_us": samples,
+                "heaviest": heaviest,
+            }
+        except RuntimeError as e:
+            # 例如服务器上未安装 PyQt5 时无法导入 gui
+            results[module] = {"error": str(e)}
+    return results
+
+
+def compare(results, baseline, threshold):
+    """返回变慢超过阈值的模块列表"""
+    regressions = []
+    for module, current in results.items():
+        previous = baseline.get(module, {})
+        if "cumulative_us" not in current or "cumulative_us" not in previous:
+            continue
+        ratio = current["cumulative_us"] / max(previous["cumulative_us"], 1)
+        status = "回归" if ratio > threshold else "正常"
+        print(f"{module:20s} {previous['cumulative_us'] / 1000:8.1f} ms -> "
+              f"{current['cumulative_us'] / 1000:8.1f} ms  x{ratio:.2f}  {status}")
+        if ratio > threshold:
+            regressions.append(module)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量入口模块的冷启动导入耗时")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="要测量的模块")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="每个模块的测量次数")
+    parser.add_argument("-o", "--output", help="将结果写入JSON文件")
+    parser.add_argument("--compare", metavar="JSON", help="与之前的结果文件对比")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="判定为回归的耗时倍数（默认: 1.25）")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.modules, args.repeat)
+    for module, result in results.items():
+        if "error" in result:
+            print(f"{module:20s} 导入失败: {result['error']}")
+        else:
+            print(f"{module:20s} {result['cumulative_us'] / 1000:8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version, "modules": results}, f,
+                      ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["modules"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
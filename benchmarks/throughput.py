@@ -0,0 +1,281 @@
+"""转换吞吐量与内存基准
+
+用法（在仓库根目录下）:
+    python benchmarks/throughput.py -o throughput.json
+    python benchmarks/throughput.py --dpi 150 300 --formats PNG --workers 1 4
+    python benchmarks/throughput.py --compare throughput.json --threshold 1.25
+
+在本地生成合成PDF（纯文本、扫描图片、混合页面尺寸、大页数），按 DPI × 格式 × 工作数
+矩阵分别运行 PDFConverter.convert_pdf_to_images（每个文档）和 batch_convert（全部文档），
+记录每秒页数、峰值内存（RSS，含poppler子进程）和首页耗时。每个用例在独立子进程中运行，
+峰值内存互不影响。--compare 与之前保存的结果对比，吞吐量下降或峰值内存上升超过阈值时
+以非零状态码退出。需要安装poppler。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+
+# 页面尺寸（点）
+A4 = (595, 842)
+LETTER = (612, 792)
+A3 = (842, 1191)
+A1 = (1684, 2384)
+
+# 合成文档：生成方式、页数和页面尺寸（循环使用）
+SCENARIOS = {
+    "text": {"kind": "text", "pages": 20, "sizes": [A4]},
+    "scan": {"kind": "scan", "pages": 10, "sizes": [A4]},
+    "mixed": {"kind": "text", "pages": 12, "sizes": [A4, LETTER, A3, A1]},
+    "large": {"kind": "text", "pages": 500, "sizes": [LETTER]},
+}
+
+
+def write_text_pdf(path, page_count, sizes, lines_per_page=45):
+    """手工写出只含文本的PDF（Helvetica，无需第三方库）"""
+    rng = random.Random(page_count)
+    words = ["render", "poppler", "page", "image", "throughput", "window",
+             "encode", "buffer", "stream", "document", "pixel"]
+    objects = []  # 按对象编号顺序保存对象内容（bytes）
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(None)  # 页面树稍后填写
+    page_ids = []
+    for index in range(page_count):
+        width, height = sizes[index % len(sizes)]
+        lines = [b"BT", b"/F1 10 Tf", b"12 TL", f"50 {height - 60} Td".encode()]
+        for _ in range(lines_per_page * height // 842):
+            text = " ".join(rng.choice(words) for _ in range(12))
+            lines.append(f"({text}) '".encode())
+        lines.append(b"ET")
+        stream = b"\n".join(lines)
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {width} {height}] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content} 0 R >>".encode()
+        ))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode()
+    catalog = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, catalog, xref))
+
+
+def write_scan_pdf(path, page_count, sizes, scan_dpi=150):
+    """用Pillow生成由整页灰度位图构成的PDF，模拟扫描件"""
+    from PIL import Image, ImageDraw
+
+    def pages():
+        for index in range(page_count):
+            width, height = sizes[index % len(sizes)]
+            size = (width * scan_dpi // 72, height * scan_dpi // 72)
+            # 纸张噪点加上文字行色块
+            image = Image.effect_noise(size, 12).point(lambda v: min(255, v + 120))
+            draw = ImageDraw.Draw(image)
+            rng = random.Random(index)
+            for y in range(scan_dpi, size[1] - scan_dpi, scan_dpi // 5):
+                draw.rectangle((scan_dpi, y, rng.randint(size[0] // 2, size[0] - scan_dpi),
+                                y + scan_dpi // 12), fill=30)
+            yield image
+
+    images = pages()
+    first = next(images)
+    first.save(path, "PDF", resolution=scan_dpi, save_all=True, append_images=images)
+
+
+def generate_documents(data_dir, scenarios, scale):
+    """生成（或复用已生成的）合成文档，返回 {场景名: 文件路径}"""
+    os.makedirs(data_dir, exist_ok=True)
+    documents = {}
+    for name in scenarios:
+        spec = SCENARIOS[name]
+        page_count = max(1, int(spec["pages"] * scale))
+        path = os.path.join(data_dir, f"{name}_{page_count}.pdf")
+        if not os.path.isfile(path):
+            writer = write_scan_pdf if spec["kind"] == "scan" else write_text_pdf
+            writer(path, page_count, spec["sizes"])
+        documents[name] = path
+    return documents
+
+
+def peak_rss_kb():
+    """本进程与已结束子进程（poppler）中最大的峰值RSS（KB），平台不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1024 if sys.platform == "darwin" else 1  # macOS 单位为字节
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) // scale
+
+
+def run_case(case):
+    """子进程中执行一个用例，返回测量结果"""
+    sys.path.insert(0, SRC_DIR)
+    from pdf_converter import PDFConverter
+
+    converter = PDFConverter()
+    output_dir = tempfile.mkdtemp(prefix="bench-")
+    first_page = []
+    pages_done = [0]
+
+    def on_page(*args):
+        pages_done[0] += 1
+        if not first_page:
+            first_page.append(time.perf_counter())
+
+    try:
+        start = time.perf_counter()
+        if case["mode"] == "single":
+            converter.convert_pdf_to_images(
+                case["documents"][0], output_dir, case["format"], case["dpi"],
+                progress_callback=on_page, workers=case["workers"]
+            )
+        else:
+            results = converter.batch_convert(
+                case["documents"], output_dir, case["format"], case["dpi"],
+                workers=case["workers"], progress_callback=on_page, resume=False
+            )
+            failed = [r["input_file"] for r in results if r["status"] != "success"]
+            if failed:
+                raise RuntimeError(f"转换失败: {failed}")
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        "pages": pages_done[0],
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages_done[0] / elapsed, 2) if elapsed else None,
+        "first_page_seconds": round(first_page[0] - start, 3) if first_page else None,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def measure_case(case):
+    """在新进程中运行用例，避免峰值内存和已导入模块互相影响"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(case)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1:] or ["未知错误"]
+        return {"error": last_line[0]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def build_cases(documents, dpis, formats, workers_list, modes):
+    cases = {}
+    for dpi in dpis:
+        for format in formats:
+            for workers in workers_list:
+                settings = {"dpi": dpi, "format": format, "workers": workers}
+                if "single" in modes:
+                    for name, path in documents.items():
+                        case_id = f"single/{name}/{format}/{dpi}dpi/w{workers}"
+                        cases[case_id] = dict(settings, mode="single", documents=[path])
+                if "batch" in modes:
+                    case_id = f"batch/{'+'.join(documents)}/{format}/{dpi}dpi/w{workers}"
+                    cases[case_id] = dict(settings, mode="batch",
+                                          documents=list(documents.values()))
+    return cases
+
+
+def compare(results, baseline, threshold):
+    """返回吞吐量下降或峰值内存上升超过阈值的用例列表"""
+    regressions = []
+    for case_id, current in results.items():
+        previous = baseline.get(case_id, {})
+        if not current.get("pages_per_second") or not previous.get("pages_per_second"):
+            continue
+        slowdown = previous["pages_per_second"] / current["pages_per_second"]
+        growth = None
+        if current.get("peak_rss_kb") and previous.get("peak_rss_kb"):
+            growth = current["peak_rss_kb"] / previous["peak_rss_kb"]
+        regressed = slowdown > threshold or (growth is not None and growth > threshold)
+        status = "回归" if regressed else "正常"
+        memory = f"  内存 x{growth:.2f}" if growth is not None else ""
+        print(f"{case_id:45s} {previous['pages_per_second']:7.2f} -> "
+              f"{current['pages_per_second']:7.2f} 页/秒  x{1 / slowdown:.2f}{memory}  {status}")
+        if regressed:
+            regressions.append(case_id)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量PDF转换吞吐量、峰值内存和首页耗时")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS),
+                        choices=list(SCENARIOS), help="合成文档场景（默认全部）")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="页数缩放系数，例如 10 生成十倍页数的文档")
+    parser.add_argument("--dpi", nargs="+", type=int, default=[100, 200], help="DPI列表")
+    parser.add_argument("--formats", nargs="+", type=str.upper, default=["PNG", "JPEG"],
+                        help="输出格式列表")
+    parser.add_argument("--workers", nargs="+", type=int,
+                        default=sorted({1, os.cpu_count() or 1}), help="工作数列表")
+    parser.add_argument("--modes", nargs="+", choices=("single", "batch"),
+                        default=["single", "batch"], help="单文件转换和/或批量转换")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(),
+                                                           "pdf_to_image_bench"),
+                        help="合成文档目录（已存在的文档直接复用）")
+    parser.add_argument("-o", "--output", help="将结果写入JSON文件")
+    parser.add_argument("--compare", metavar="JSON", help="与之前的结果文件对比")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="判定为回归的倍数（默认: 1.25）")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+
+    documents = generate_documents(args.data_dir, args.scenarios, args.scale)
+    cases = build_cases(documents, args.dpi, args.formats, args.workers, args.modes)
+    results = {}
+    for case_id, case in cases.items():
+        result = measure_case(case)
+        results[case_id] = result
+        if "error" in result:
+            print(f"{case_id:45s} 失败: {result['error']}")
+        else:
+            rss = f"{result['peak_rss_kb'] / 1024:7.1f} MB" if result["peak_rss_kb"] else "      -"
+            print(f"{case_id:45s} {result['pages_per_second']:7.2f} 页/秒  "
+                  f"首页 {result['first_page_seconds']:6.3f} 秒  峰值 {rss}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version, "cpu_count": os.cpu_count(),
+                       "cases": results}, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["cases"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,7 +13,7 @@ pyinstaller --name="PDF转图片工具" ^
             --windowed ^
             --icon=assets/icon.ico ^
             --add-data="src;src" ^
-            src/main.py
+            src/mian.py
 
 echo 构建完成！
 echo 可执行文件位置: dist/PDF转图片工具.exe
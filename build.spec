@@ -3,8 +3,8 @@
 block_cipher = None
 
 a = Analysis(
-    ['src/main.py'],
-    pathex=[],
+    ['src/mian.py'],
+    pathex=['src'],
     binaries=[],
     datas=[('src', 'src')],
     hiddenimports=[
@@ -0,0 +1,373 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from pdf_converter import PDFConverter, ConversionCancelled, DEFAULT_CHUNK_SIZE
+from utils import (parse_page_selection, estimate_output_bytes, get_available_disk_space,
+                   format_file_size)
+from pdf_index import estimate_page_costs
+from memory_budget import MemoryBudget, estimate_page_peak
+from encoder_profiles import EncodeStats, encoding_variant
+
+logger = logging.getLogger(__name__)
+
+# 单个页面块任务的最大页数，页数更多的文件拆分后与其他文件交错调度
+DEFAULT_SPLIT_PAGES = 50
+
+
+def run_per_file(pdf_files, convert, workers, cancel_event=None):
+    """在有界线程池中对每个文件调用 convert(pdf_file)，按完成顺序产出 (pdf_file, 结果, 异常)
+
+    适用于按整文件输出的模式（多页TIFF/归档、多种输出配置）。在途任务不超过 workers*2 个；
+    cancel_event 被设置后不再提交新文件，调用方提前停止迭代时同样设置 cancel_event。
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    pending = iter(pdf_files)
+    in_flight = {}
+    try:
+        while True:
+            while len(in_flight) < workers * 2 and not (cancel_event and cancel_event.is_set()):
+                pdf_file = next(pending, None)
+                if pdf_file is None:
+                    break
+                in_flight[executor.submit(convert, pdf_file)] = pdf_file
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf_file = in_flight.pop(future)
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    result, error = None, e
+                yield pdf_file, result, error
+    finally:
+        if in_flight and cancel_event is not None:
+            cancel_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class BatchScheduler:
+    """批量转换调度器
+
+    在有界线程池中并发处理多个PDF：渲染由poppler子进程完成，编码时Pillow释放GIL，
+    因此线程即可占满多核。任务按估算成本降序调度，大文件拆分为页面块以避免长尾；
+    每个文件全部完成后立即产出结果记录。
+    """
+
+    def __init__(self, converter=None, workers=None,
+                 split_pages=DEFAULT_SPLIT_PAGES, chunk_size=DEFAULT_CHUNK_SIZE,
+                 manifest=None, memory_budget=None, tile_output=None,
+                 encoding=None, max_output_bytes=None):
+        self.converter = converter or PDFConverter()
+        # 可选的 ConversionManifest，用于跳过已完成页面并记录进度
+        self.manifest = manifest
+        # 可选的整批内存上限（字节），各任务开始前按估算峰值预留
+        self.memory_budget = MemoryBudget(memory_budget) if memory_budget else None
+        # 单页超出预算时的分块输出方式（'tiff' 或 'tiles'），None 表示报错
+        self.tile_output = tile_output
+        # 编码配置名（见 encoder_profiles），整批累计的写出字节数和编码用时见 encode_stats
+        self.encoding = encoding
+        self.encode_stats = EncodeStats()
+        # 可选的整批输出上限（字节），与目标卷可用空间一起决定接纳哪些文件
+        self.max_output_bytes = max_output_bytes
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.split_pages = split_pages
+        self.chunk_size = chunk_size
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """取消批量任务：未开始的任务不再执行，进行中的文件在当前页保存后停止"""
+        self._cancel_event.set()
+
+    def plan(self, pdf_files, pages=None):
+        """生成调度任务列表 [(文件序号, 页码列表或None, 该文件待转换页数或None), ...]
+
+        根据文档索引估算每个文件的渲染成本（页面面积，扫描页加权），成本高的文件排在前面；
+        文件按成本拆分为页面块，每块不超过 split_pages 页，且单块成本不超过全批的
+        1/(workers*4)，避免一个大文件形成长尾。无法建立索引的文件按文件大小估算并整文件调度。
+        pages 为应用于每个文件的页码列表或页码选择字符串，默认全部页面。
+        """
+        planned = []
+        for index, pdf_file in enumerate(pdf_files):
+            selected, costs = pages, None
+            try:
+                entry = self.converter.index.get(pdf_file)
+                page_count = entry['page_count']
+                if pages is None:
+                    selected = list(range(1, page_count + 1))
+                elif isinstance(pages, str):
+                    selected = parse_page_selection(pages, page_count)
+                else:
+                    selected = sorted(set(pages))
+                if all(1 <= page <= page_count for page in selected):
+                    costs = estimate_page_costs(entry, selected)
+            except Exception as e:
+                # 无法预先解析时整文件调度，错误留给转换阶段报告
+                logger.warning(f"无法建立文档索引，按整文件调度 {pdf_file}: {e}")
+                selected = pages
+
+            if costs is None:
+                try:
+                    file_cost = os.path.getsize(pdf_file) / (100 * 1024)
+                except OSError:
+                    file_cost = 0
+            else:
+                file_cost = sum(costs)
+            planned.append((file_cost, index, selected, costs))
+        planned.sort(key=lambda item: (-item[0], item[1]))
+
+        total_cost = sum(item[0] for item in planned)
+        max_chunk_cost = total_cost / (self.workers * 4) if total_cost else 0
+        min_chunk_pages = max(1, self.chunk_size or 1)
+
+        tasks = []
+        for file_cost, index, selected, costs in planned:
+            if costs is None or not self.split_pages:
+                tasks.append((index, selected, len(costs) if costs else None))
+                continue
+
+            chunk, chunk_cost = [], 0
+            for page_number, cost in zip(selected, costs):
+                chunk.append(page_number)
+                chunk_cost += cost
+                if (len(chunk) >= self.split_pages
+                        or (chunk_cost >= max_chunk_cost and len(chunk) >= min_chunk_pages)):
+                    tasks.append((index, chunk, len(selected)))
+                    chunk, chunk_cost = [], 0
+            if chunk:
+                tasks.append((index, chunk, len(selected)))
+        return tasks
+
+    def run(self, pdf_files, output_dir, format='PNG', dpi=200,
+            progress_callback=None, with_index=False, pages=None):
+        """执行批量转换，按完成顺序逐个产出结果记录
+
+        结果记录与 PDFConverter.batch_convert 相同：成功为
+        {'input_file', 'output_files', 'status': 'success'}，失败为
+        {'input_file', 'error', 'status': 'failed'}，取消为
+        {'input_file', 'output_files', 'status': 'cancelled'}（output_files 为已完成部分）。
+        progress_callback(pdf_file, 已完成页数, 总页数) 会在工作线程中调用。
+        with_index 为 True 时产出 (文件序号, 结果记录)；pages 为每个文件的页码选择。
+        预计输出放不下的文件在写出任何内容前即以失败记录产出，见 admit_by_output_space。
+        """
+        tasks = self.plan(pdf_files, pages)
+        tasks, refused = self.admit_by_output_space(tasks, pdf_files, output_dir, format, dpi)
+        for index, error in refused.items():
+            record = {'input_file': pdf_files[index], 'error': error, 'status': 'failed'}
+            yield (index, record) if with_index else record
+        tasks.reverse()  # 从列表尾部弹出，保持计划顺序
+
+        lock = threading.Lock()
+        metrics = self.converter.metrics
+        states = {}
+        for index, _, page_count in tasks:
+            # 各页面块的分阶段耗时和编码统计按文件汇总，文件完成时记录一次文档指标
+            state = states.setdefault(index, {
+                'pending': 0, 'parts': [], 'error': None, 'cancelled': False,
+                'done_pages': 0, 'total_pages': page_count, 'reported': False,
+                'timings': metrics.new_job() if metrics is not None else None,
+                'stats': EncodeStats(),
+            })
+            state['pending'] += 1
+        total_files = len(states)
+        finished_files = 0
+
+        def make_callback(index):
+            pdf_file = pdf_files[index]
+            state = states[index]
+
+            def on_page(current, total):
+                with lock:
+                    state['done_pages'] += 1
+                    done = state['done_pages']
+                    total = state['total_pages'] or total
+                if progress_callback:
+                    progress_callback(pdf_file, done, total)
+            return on_page
+
+        def finish(index):
+            state = states[index]
+            pdf_file = pdf_files[index]
+            output_files = [path for _, paths in sorted(state['parts'])
+                            for path in paths]
+            if state['error'] is not None:
+                record = {'input_file': pdf_file, 'error': state['error'],
+                          'status': 'failed'}
+            elif state['cancelled']:
+                record = {'input_file': pdf_file, 'output_files': output_files,
+                          'status': 'cancelled'}
+            else:
+                record = {'input_file': pdf_file, 'output_files': output_files,
+                          'status': 'success'}
+            stats = state['stats'].snapshot()
+            self.encode_stats.merge(stats)
+            if metrics is not None:
+                started = state.get('started')
+                seconds = time.perf_counter() - started if started is not None else 0.0
+                metrics.record_document(pdf_file, record['status'], state['done_pages'],
+                                        seconds, state['timings'], stats['bytes_written'])
+            return (index, record) if with_index else record
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        in_flight = {}
+        try:
+            while tasks or in_flight:
+                # 保持有界的在途任务数，取消后不再提交新任务
+                while tasks and len(in_flight) < self.workers * 2 and not self.cancelled:
+                    task = tasks.pop()
+                    future = executor.submit(self._run_task, task, pdf_files,
+                                             output_dir, format, dpi,
+                                             make_callback(task[0]), states[task[0]])
+                    in_flight[future] = task
+
+                if self.cancelled and tasks:
+                    # 未开始的任务直接标记为取消
+                    for index, _, _ in tasks:
+                        states[index]['cancelled'] = True
+                        states[index]['pending'] -= 1
+                    tasks = []
+                    for index, state in states.items():
+                        if state['pending'] == 0 and not state['reported']:
+                            state['reported'] = True
+                            yield finish(index)
+                    if not in_flight:
+                        break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, pages, _ = in_flight.pop(future)
+                    state = states[index]
+                    try:
+                        saved_files = future.result()
+                        state['parts'].append((pages[0] if pages else 0, saved_files))
+                    except ConversionCancelled:
+                        state['cancelled'] = True
+                    except Exception as e:
+                        logger.error(f"处理文件失败 {pdf_files[index]}: {e}")
+                        if state['error'] is None:
+                            state['error'] = str(e)
+                    state['pending'] -= 1
+
+                    if state['pending'] == 0:
+                        state['reported'] = True
+                        finished_files += 1
+                        logger.info(f"完成文件 {finished_files}/{total_files}: "
+                                    f"{pdf_files[index]}")
+                        yield finish(index)
+        finally:
+            # 调用方提前停止迭代时同样取消剩余任务
+            if tasks or in_flight:
+                self.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def admit_by_output_space(self, tasks, pdf_files, output_dir, format='PNG', dpi=200):
+        """写出前按预计输出字节数接纳文件
+        
+        按计划顺序（成本降序）累计各文件的预计输出（不含清单中已完成的页面和可硬链接的
+        渲染缓存命中页面），放不下
+        目标卷可用空间（扣除转换器的 disk_reserve）或整批上限 max_output_bytes 的文件被拒绝，
+        后面较小的文件仍可接纳。无法建立索引的文件不计入。
+        返回 (接纳的任务列表, {被拒绝的文件序号: 错误信息})。
+        """
+        free = get_available_disk_space(output_dir)
+        limit = free - self.converter.disk_reserve if free is not None else None
+        if self.max_output_bytes is not None:
+            limit = self.max_output_bytes if limit is None else min(limit, self.max_output_bytes)
+        if limit is None:
+            return tasks, {}
+        
+        file_pages = {}
+        for index, pages, _ in tasks:
+            file_pages.setdefault(index, []).append(pages)
+        
+        admitted_bytes, refused = 0, {}
+        for index, chunks in file_pages.items():
+            if any(pages is None or isinstance(pages, str) for pages in chunks):
+                continue
+            estimate = self._estimate_output_bytes(
+                pdf_files[index], [page for pages in chunks for page in pages], output_dir,
+                format, dpi
+            )
+            if admitted_bytes + estimate > limit:
+                refused[index] = (f"输出空间不足: 预计输出 {format_file_size(estimate)}，"
+                                  f"本批剩余可用 {format_file_size(max(0, limit - admitted_bytes))}")
+            else:
+                admitted_bytes += estimate
+        
+        logger.info(f"整批预计输出 {format_file_size(admitted_bytes)}，"
+                    f"可用额度 {format_file_size(max(0, limit))}")
+        if refused:
+            logger.warning(f"输出空间不足，{len(refused)} 个文件不转换")
+        return [task for task in tasks if task[0] not in refused], refused
+    
+    def _estimate_output_bytes(self, pdf_file, pages, output_dir, format, dpi):
+        """估算文件待转换页面的输出字节数；无法估算时返回 0"""
+        try:
+            page_sizes = self.converter.index.get(pdf_file)['page_sizes']
+            if self.manifest is not None:
+                completed = self.manifest.completed_pages(pdf_file, dpi, format,
+                                                           self.encoding)
+                pages = [page for page in pages if page not in completed]
+            cache = self.converter.cache
+            if cache is not None and cache.links_to(output_dir):
+                document_hash = cache.document_hash(pdf_file)
+                variant = encoding_variant(self.encoding)
+                pages = [page for page in pages if not cache.contains(
+                    cache.page_key(document_hash, page, dpi, format, variant))]
+            return estimate_output_bytes([page_sizes[page - 1] for page in pages], dpi,
+                                         format, self.encoding, self.converter.size_model)
+        except Exception:
+            return 0
+    
+    def _run_task(self, task, pdf_files, output_dir, format, dpi, on_page, state):
+        """工作线程：转换整个文件或其中一个页面块"""
+        index, pages, _ = task
+        pdf_file = pdf_files[index]
+        if self.cancelled:
+            raise ConversionCancelled(f"转换已取消: {pdf_file}")
+        # 文档耗时从该文件第一个页面块开始计算
+        state.setdefault('started', time.perf_counter())
+
+        if self.memory_budget is None:
+            return self._convert(pdf_file, pages, output_dir, format, dpi, on_page, state)
+
+        # 预算不足时在此等待其他任务释放内存
+        estimate = self._estimate_task_bytes(pdf_file, pages, dpi)
+        with self.memory_budget.reserve(estimate) as reserved:
+            if self.cancelled:
+                raise ConversionCancelled(f"转换已取消: {pdf_file}")
+            return self._convert(pdf_file, pages, output_dir, format, dpi, on_page, state,
+                                 memory_budget=reserved)
+
+    def _estimate_task_bytes(self, pdf_file, pages, dpi):
+        """估算任务峰值内存：最大页面的峰值乘以渲染窗口页数；无法估算时预留全部预算"""
+        try:
+            entry = self.converter.index.get(pdf_file)
+            if pages is None or isinstance(pages, str):
+                pages = range(1, entry['page_count'] + 1)
+            largest = max(estimate_page_peak(*entry['page_sizes'][page - 1], dpi)
+                          for page in pages)
+        except Exception:
+            return self.memory_budget.total_bytes
+        return largest * min(self.chunk_size or len(pages), len(pages))
+
+    def _convert(self, pdf_file, pages, output_dir, format, dpi, on_page, state,
+                 memory_budget=None):
+        output_subdir = os.path.join(output_dir, Path(pdf_file).stem)
+        # 调度器已在任务之间并行，单个任务内不再另开编码线程池
+        return self.converter.convert_pdf_to_images(
+            pdf_file, output_subdir, format, dpi,
+            progress_callback=on_page, chunk_size=self.chunk_size,
+            pages=pages, cancel_event=self._cancel_event, manifest=self.manifest,
+            encoder_threads=1, memory_budget=memory_budget,
+            tile_output=self.tile_output, encoding=self.encoding,
+            encode_stats=state['stats'], timings=state['timings']
+        )
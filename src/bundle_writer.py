@@ -0,0 +1,102 @@
+import io
+import os
+import time
+import tarfile
+import zipfile
+from encoder_profiles import prepare_image
+
+# 打包输出方式：多页TIFF，或将各页图片写入ZIP/TAR归档
+BUNDLE_TYPES = ('tiff', 'zip', 'tar')
+_BUNDLE_EXTENSIONS = {
+    '.tif': 'tiff', '.tiff': 'tiff',
+    '.zip': 'zip',
+    '.tar': 'tar',
+}
+
+
+def bundle_type_for_path(path):
+    """按扩展名推断打包方式，无法识别时返回 None"""
+    return _BUNDLE_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def encode_page_bytes(image, format, encoding=None, save_options=None,
+                      as_memoryview=False):
+    """将单页编码为内存中的图片数据，返回 (bytes, 编码用时秒数)
+
+    as_memoryview 为 True 时返回指向编码缓冲区的 memoryview，不再复制一份 bytes。
+    """
+    start = time.perf_counter()
+    if encoding is not None:
+        image, options = prepare_image(image, format, encoding)
+    else:
+        options = {}
+        if format.upper() == 'JPEG':
+            image = image.convert('RGB')
+    options.update(save_options or {})
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    data = buffer.getbuffer() if as_memoryview else buffer.getvalue()
+    return data, time.perf_counter() - start
+
+
+class BundleWriter:
+    """把一个文档的所有页面逐页追加到单个输出文件
+
+    'tiff' 写出多页TIFF（Pillow AppendingTiffWriter，每页一个IFD）；
+    'zip'/'tar' 将每页图片作为一个条目写入归档（ZIP不再压缩已压缩的图片数据）。
+    页面写入后即释放，内存占用与页数无关。先写入 path.part，close() 时原子重命名，
+    abort() 删除未完成的文件。多页TIFF使用经典TIFF格式，文件不能超过4GB。
+    """
+
+    def __init__(self, path, bundle_type, dpi=None):
+        if bundle_type not in BUNDLE_TYPES:
+            raise ValueError(f"不支持的打包方式: {bundle_type}")
+        self.path = path
+        self.bundle_type = bundle_type
+        self.dpi = dpi
+        self.pages_written = 0
+        self.temp_path = f"{path}.part"
+        if bundle_type == 'tiff':
+            from PIL import TiffImagePlugin
+            self._bundle = TiffImagePlugin.AppendingTiffWriter(self.temp_path, True)
+        elif bundle_type == 'zip':
+            self._bundle = zipfile.ZipFile(self.temp_path, 'w', zipfile.ZIP_STORED,
+                                           allowZip64=True)
+        else:
+            self._bundle = tarfile.open(self.temp_path, 'w', format=tarfile.PAX_FORMAT)
+
+    def add_tiff_page(self, image, options=None):
+        """向多页TIFF追加一页，返回写入的字节数；image 应已按编码配置转换好颜色模式"""
+        options = dict(options or {})
+        if self.dpi:
+            options.setdefault('dpi', (self.dpi, self.dpi))
+        file = self._bundle.f
+        start = file.seek(0, os.SEEK_END)
+        image.save(self._bundle, format='TIFF', **options)
+        self._bundle.newFrame()
+        self.pages_written += 1
+        return file.seek(0, os.SEEK_END) - start
+
+    def add_file(self, name, data):
+        """向ZIP/TAR归档追加一个条目，返回数据字节数"""
+        if self.bundle_type == 'zip':
+            self._bundle.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._bundle.addfile(info, io.BytesIO(data))
+        self.pages_written += 1
+        return len(data)
+
+    def close(self):
+        self._bundle.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        try:
+            self._bundle.close()
+        except Exception:
+            pass  # 未完成的文件随后删除，收尾失败无关紧要
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
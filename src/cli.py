@@ -0,0 +1,360 @@
+"""PDF转图片命令行工具（无需图形界面，不加载PyQt5）
+
+用法（在 src 目录下）:
+    python -m cli input.pdf -o output -f PNG --dpi 200
+    python -m cli docs/ -o batch_output -j 8
+    python -m cli input.pdf -o output --profile master:PNG:300 --profile thumb:JPEG:200px
+    python -m cli --watch inbox -o batch_output --interval 5
+"""
+import os
+import sys
+import time
+import threading
+import argparse
+import logging
+import multiprocessing
+from pathlib import Path
+from pdf_converter import PDFConverter, SUPPORTED_FORMATS, DEFAULT_ENCODER_THREADS
+from batch_scheduler import BatchScheduler, run_per_file
+from manifest import ConversionManifest
+from output_profiles import parse_profile_spec
+from encoder_profiles import ENCODING_PROFILES, EncodeStats
+from metrics import ConversionMetrics, capture_profile
+from utils import format_file_size, validate_page_selection, CompressionModel
+from log_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def collect_pdf_files(inputs):
+    """展开输入参数：文件原样保留，目录取其中的 *.pdf"""
+    pdf_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pdf_files.extend(str(p) for p in sorted(Path(item).glob("*.pdf")))
+        else:
+            pdf_files.append(item)
+    return pdf_files
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m cli",
+        description="将PDF转换为图片（命令行 / 监视文件夹模式）"
+    )
+    parser.add_argument("inputs", nargs="*", help="PDF文件或包含PDF的目录")
+    parser.add_argument("-o", "--output-dir", default="output", help="输出目录（默认: output）")
+    parser.add_argument("-f", "--format", default="PNG", type=str.upper,
+                        choices=SUPPORTED_FORMATS, help="输出格式（默认: PNG）")
+    parser.add_argument("--dpi", type=int, default=200, help="渲染DPI（默认: 200）")
+    parser.add_argument("--encoding", choices=tuple(ENCODING_PROFILES),
+                        help="编码配置：fast 编码最快，balanced 均衡，smallest 体积最小"
+                             "（单色页面自动转为灰度/1位图）；默认使用Pillow默认参数")
+    parser.add_argument("--prefix", help="输出文件名前缀（仅单文件时有效，默认使用PDF文件名）")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="并行工作数（默认: CPU核数）")
+    parser.add_argument("--pages", help='页码选择，如 "1"、"1-5,9"、"last"、"3-last"（默认全部页面）')
+    parser.add_argument("--profile", action="append", metavar="SPEC",
+                        help='输出配置 "名称:格式:DPI[:质量]"（DPI写作 200px 表示最长边像素数），'
+                             '可重复指定；每页只渲染一次，各配置写入同名子目录')
+    parser.add_argument("--bundle", choices=("tiff", "zip", "tar"),
+                        help="每个PDF只写出一个文件：多页TIFF，或将各页图片写入ZIP/TAR归档")
+    parser.add_argument("--cache-dir", help="渲染缓存目录，相同内容和参数的页面不再重新渲染")
+    parser.add_argument("--cache-size", type=int, default=2048,
+                        help="渲染缓存容量上限MB（默认: 2048）")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="任务内存上限MB，按页面尺寸和DPI自动调整并发和窗口大小")
+    parser.add_argument("--tile-output", choices=("tiff", "tiles"),
+                        help="单页超出内存预算时分块渲染：拼接为分块TIFF或写出分块图片目录")
+    parser.add_argument("--max-output", type=int, metavar="MB",
+                        help="输出上限MB：单文件预计输出超出时拒绝转换，批量时只接纳放得下的文件"
+                             "（--profile/--bundle 按每个文件计）")
+    parser.add_argument("--disk-reserve", type=int, default=256, metavar="MB",
+                        help="写完预计输出后目标卷至少保留的可用空间MB（默认: 256）")
+    parser.add_argument("--size-model", metavar="FILE",
+                        help="压缩率模型JSON文件，用于估算输出大小，每次转换后按实际大小更新")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="写出分阶段耗时指标：.prom/.txt 为Prometheus文本格式，其他为JSON")
+    parser.add_argument("--cprofile", metavar="FILE",
+                        help="用cProfile分析本次转换并写出统计文件（建议配合 -j 1）")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="跟踪Python内存分配，结束后输出峰值和分配最多的位置")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="忽略输出目录中的转换清单，重新转换全部页面")
+    parser.add_argument("--watch", metavar="DIR", help="监视文件夹，持续转换新到达的PDF")
+    parser.add_argument("--interval", type=float, default=5.0,
+                        help="监视模式的轮询间隔秒数（默认: 5）")
+    parser.add_argument("--log-file", help="同时将日志写入文件（按10MB轮转，保留5个历史文件）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出详细日志")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出错误")
+    return parser
+
+
+def open_cache(args):
+    """按命令行参数创建渲染缓存，未指定 --cache-dir 时返回 None"""
+    if not args.cache_dir:
+        return None
+    from render_cache import RenderCache
+    return RenderCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+
+def max_output_bytes(args):
+    """--max-output（MB）换算为字节，未指定时返回 None"""
+    return args.max_output * 1024 * 1024 if args.max_output else None
+
+
+def convert_files(converter, manifest, pdf_files, args, pages, single_file=False):
+    """转换一组文件，返回失败（含取消）的文件数
+
+    single_file 为 True（命令行只指定了一个PDF文件）时输出直接写入输出目录并使用 --prefix；
+    目录输入和监视模式无论本次有几个文件，都按批量方式写入各自的子目录，
+    输出位置不随同一次轮询到达的文件数变化。
+    """
+    workers = args.workers or os.cpu_count() or 1
+    if args.profile:
+        return convert_profiles(converter, pdf_files, args, pages, single_file)
+    if args.bundle:
+        return convert_bundles(converter, pdf_files, args, pages, single_file)
+    memory_budget = args.memory_budget * 1024 * 1024 if args.memory_budget else None
+    max_output = max_output_bytes(args)
+
+    if single_file:
+        # 单个文件：按页面窗口在进程池中并行渲染
+        pdf_file = pdf_files[0]
+        encode_stats = EncodeStats()
+        try:
+            saved_files = converter.convert_pdf_to_images(
+                pdf_file, args.output_dir, args.format, args.dpi, args.prefix,
+                workers=workers, pages=pages, manifest=manifest,
+                memory_budget=memory_budget, tile_output=args.tile_output,
+                encoding=args.encoding, encode_stats=encode_stats,
+                max_output_bytes=max_output
+            )
+        except Exception as e:
+            print(f"失败: {pdf_file} - {e}", file=sys.stderr)
+            return 1
+        print(f"完成: {pdf_file} -> {len(saved_files)} 个文件")
+        report_encoding(encode_stats)
+        report_cache(converter)
+        return 0
+
+    if args.prefix:
+        logger.warning("批量模式下忽略 --prefix，输出文件使用各自的PDF文件名")
+
+    failed = 0
+    scheduler = BatchScheduler(converter, workers=workers, manifest=manifest,
+                               memory_budget=memory_budget,
+                               tile_output=args.tile_output,
+                               encoding=args.encoding,
+                               max_output_bytes=max_output)
+    for result in scheduler.run(pdf_files, args.output_dir, args.format, args.dpi,
+                                pages=pages):
+        if result['status'] == 'success':
+            print(f"完成: {result['input_file']} -> {len(result['output_files'])} 个文件")
+        elif result['status'] == 'failed':
+            failed += 1
+            print(f"失败: {result['input_file']} - {result['error']}", file=sys.stderr)
+        else:
+            failed += 1
+            print(f"已取消: {result['input_file']}", file=sys.stderr)
+    report_encoding(scheduler.encode_stats)
+    report_cache(converter)
+    return failed
+
+
+def convert_profiles(converter, pdf_files, args, pages, single_file=False):
+    """按 --profile 配置转换文件（每页渲染一次生成全部输出），返回失败的文件数
+
+    多个文件在 -j 个线程中并发转换，此时单个文件内不再另开编码线程池。
+    """
+    profiles = [dict(parse_profile_spec(spec), encoding=args.encoding)
+                for spec in args.profile]
+    workers = args.workers or os.cpu_count() or 1
+    encoder_threads = 1 if workers > 1 and len(pdf_files) > 1 else DEFAULT_ENCODER_THREADS
+    prefix = args.prefix if single_file else None
+    encode_stats = EncodeStats()
+    cancel_event = threading.Event()
+
+    def convert(pdf_file):
+        return converter.convert_with_profiles(
+            pdf_file, args.output_dir, profiles, prefix, pages=pages,
+            cancel_event=cancel_event, encoder_threads=encoder_threads,
+            encode_stats=encode_stats, max_output_bytes=max_output_bytes(args)
+        )
+
+    failed = 0
+    for pdf_file, results, error in run_per_file(pdf_files, convert, workers,
+                                                  cancel_event):
+        if error is not None:
+            failed += 1
+            print(f"失败: {pdf_file} - {error}", file=sys.stderr)
+            continue
+        summary = "，".join(f"{name} {len(paths)} 个" for name, paths in results.items())
+        print(f"完成: {pdf_file} -> {summary}")
+    report_encoding(encode_stats)
+    return failed
+
+
+def convert_bundles(converter, pdf_files, args, pages, single_file=False):
+    """按 --bundle 将每个文件写成一个多页TIFF或归档，返回失败的文件数
+
+    多个文件在 -j 个线程中并发转换，此时单个文件内不再另开编码线程池。
+    """
+    workers = args.workers or os.cpu_count() or 1
+    encoder_threads = 1 if workers > 1 and len(pdf_files) > 1 else DEFAULT_ENCODER_THREADS
+    encode_stats = EncodeStats()
+    prefix = args.prefix if single_file else None
+    cancel_event = threading.Event()
+
+    def convert(pdf_file):
+        name = prefix or Path(pdf_file).stem
+        output_path = os.path.join(args.output_dir, f"{name}.{args.bundle}")
+        return converter.convert_pdf_to_bundle(
+            pdf_file, output_path, args.format, args.dpi, args.bundle, prefix,
+            pages=pages, cancel_event=cancel_event, encoder_threads=encoder_threads,
+            encoding=args.encoding, encode_stats=encode_stats,
+            max_output_bytes=max_output_bytes(args)
+        )
+
+    failed = 0
+    for pdf_file, output_path, error in run_per_file(pdf_files, convert, workers,
+                                                      cancel_event):
+        if error is not None:
+            failed += 1
+            print(f"失败: {pdf_file} - {error}", file=sys.stderr)
+        else:
+            print(f"完成: {pdf_file} -> {output_path}")
+    report_encoding(encode_stats)
+    return failed
+
+
+def warn_ignored_options(args, mode):
+    """整文件输出模式不使用转换清单、渲染缓存和内存预算，相关参数被忽略时给出警告"""
+    ignored = [flag for flag, value in (
+        ("--memory-budget", args.memory_budget), ("--tile-output", args.tile_output),
+        ("--cache-dir", args.cache_dir), ("--no-resume", args.no_resume),
+    ) if value]
+    if ignored:
+        logger.warning(f"{mode} 模式总是完整转换每个文件，不使用断点续转、渲染缓存和内存预算，"
+                       f"忽略: {'、'.join(ignored)}")
+
+
+def report_encoding(encode_stats):
+    stats = encode_stats.snapshot()
+    if stats['pages']:
+        print(f"写出 {stats['pages']} 个文件，共 {format_file_size(stats['bytes_written'])}，"
+              f"编码用时 {stats['encode_seconds']:.2f} 秒")
+
+
+def write_metrics(converter, args):
+    if converter.metrics is not None:
+        converter.metrics.write(args.metrics)
+        logger.info(f"指标已写入: {args.metrics}")
+
+
+def report_profile(report):
+    if 'profile_path' in report:
+        print(f"cProfile 统计已写入: {report['profile_path']}")
+    if 'memory_peak' in report:
+        print(f"Python内存分配峰值: {format_file_size(report['memory_peak'])}")
+        for line in report['memory_top']:
+            print(f"  {line}")
+
+
+def report_cache(converter):
+    if converter.cache is not None:
+        stats = converter.cache.stats()
+        logger.info(f"渲染缓存: 命中 {stats['hits']}，未命中 {stats['misses']}，"
+                    f"淘汰 {stats['evictions']}，{stats['entries']} 项 / {stats['bytes']} 字节")
+
+
+def watch_folder(converter, manifest, watch_dir, args, pages):
+    """监视文件夹：文件大小和修改时间在两次轮询间保持不变后才开始转换"""
+    logger.info(f"开始监视文件夹: {watch_dir}（Ctrl+C 退出）")
+    seen = {}        # 路径 -> 上次轮询时的 (大小, 修改时间)
+    processed = {}   # 路径 -> 已转换版本的 (大小, 修改时间)
+
+    while True:
+        ready = []
+        for pdf_path in sorted(Path(watch_dir).glob("*.pdf")):
+            pdf_file = str(pdf_path)
+            try:
+                stat = pdf_path.stat()
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            if processed.get(pdf_file) == signature:
+                continue
+            if seen.get(pdf_file) == signature and stat.st_size > 0:
+                ready.append(pdf_file)
+            seen[pdf_file] = signature
+
+        if ready:
+            convert_files(converter, manifest, ready, args, pages)
+            write_metrics(converter, args)
+            for pdf_file in ready:
+                processed[pdf_file] = seen[pdf_file]
+
+        time.sleep(args.interval)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    level = logging.INFO if args.verbose else logging.WARNING
+    setup_logging(logging.ERROR if args.quiet else level, log_file=args.log_file)
+
+    pages = args.pages
+    try:
+        if pages:
+            validate_page_selection(pages)
+        for spec in args.profile or []:
+            parse_profile_spec(spec)
+        if args.profile and args.bundle:
+            raise ValueError("--profile 与 --bundle 不能同时使用")
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    if args.bundle:
+        warn_ignored_options(args, "--bundle")
+    elif args.profile:
+        warn_ignored_options(args, "--profile")
+
+    if args.watch:
+        if not os.path.isdir(args.watch):
+            print(f"错误: 监视目录不存在: {args.watch}", file=sys.stderr)
+            return 2
+    else:
+        pdf_files = collect_pdf_files(args.inputs)
+        if not pdf_files:
+            print("错误: 未找到要转换的PDF文件", file=sys.stderr)
+            return 2
+
+    metrics = ConversionMetrics() if args.metrics else None
+    converter = PDFConverter(cache=open_cache(args), metrics=metrics,
+                             size_model=CompressionModel(args.size_model),
+                             disk_reserve=args.disk_reserve * 1024 * 1024)
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = ConversionManifest.for_output_dir(args.output_dir,
+                                                 reset=args.no_resume)
+    try:
+        if args.watch:
+            try:
+                watch_folder(converter, manifest, args.watch, args, pages)
+            except KeyboardInterrupt:
+                logger.warning("已停止监视")
+            return 0
+        with capture_profile(args.cprofile, args.tracemalloc) as report:
+            single_file = len(args.inputs) == 1 and os.path.isfile(args.inputs[0])
+            failed = convert_files(converter, manifest, pdf_files, args, pages,
+                                   single_file)
+        report_profile(report)
+        write_metrics(converter, args)
+        return 1 if failed else 0
+    finally:
+        manifest.close()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
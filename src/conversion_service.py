@@ -0,0 +1,206 @@
+import os
+import time
+import itertools
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from pdf_converter import PDFConverter, ConversionCancelled
+
+logger = logging.getLogger(__name__)
+
+# 保留的已结束任务数，超出后淘汰最早结束的任务
+DEFAULT_JOB_HISTORY = 1000
+
+
+def _warm_up(_):
+    """进程池预热任务：让工作进程在服务启动时就创建好"""
+    return os.getpid()
+
+
+class ConversionJob:
+    """一次提交的转换任务
+
+    status 为 'pending'、'running'、'success'、'failed' 或 'cancelled'；
+    future 完成后 result() 返回输出路径列表，失败时抛出转换异常，取消时抛出
+    ConversionCancelled。可在任意线程中查询和取消。
+    """
+
+    def __init__(self, job_id, pdf_path, output_dir):
+        self.id = job_id
+        self.pdf_path = pdf_path
+        self.output_dir = output_dir
+        self.future = None
+        self.cancel_event = threading.Event()
+        self.done_pages = 0
+        self.total_pages = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def status(self):
+        if self.future.cancelled():
+            return 'cancelled'
+        if not self.future.done():
+            return 'running' if self.started_at is not None else 'pending'
+        error = self.future.exception()
+        if error is None:
+            return 'success'
+        return 'cancelled' if isinstance(error, ConversionCancelled) else 'failed'
+
+    def cancel(self):
+        """取消任务：未开始的任务不再执行，进行中的任务在当前页保存后停止"""
+        self.cancel_event.set()
+        self.future.cancel()
+
+    def result(self, timeout=None):
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise ConversionCancelled(f"转换已取消: {self.pdf_path}")
+
+    def info(self):
+        """任务状态字典，可直接序列化为JSON"""
+        status = self.status
+        info = {
+            'id': self.id, 'input_file': self.pdf_path, 'output_dir': self.output_dir,
+            'status': status, 'done_pages': self.done_pages,
+            'total_pages': self.total_pages, 'submitted_at': self.submitted_at,
+            'started_at': self.started_at, 'finished_at': self.finished_at,
+        }
+        if status == 'failed':
+            info['error'] = str(self.future.exception())
+        return info
+
+
+class ConversionService:
+    """长期运行的转换服务
+
+    所有任务共用一个 PDFConverter（文档索引、渲染缓存、压缩率模型和指标随之复用），
+    由 max_jobs 个常驻线程执行。render_processes 大于0时创建常驻渲染进程池并在启动时
+    预热，多进程渲染的任务不再每次创建和销毁进程；进程池因子进程崩溃损坏时自动重建。
+    pdftoppm 本身是一次性命令行进程，每个渲染窗口仍启动一次。
+    已结束的任务保留最近 history 个，可按任务ID查询。
+    """
+
+    def __init__(self, converter=None, max_jobs=None, render_processes=0,
+                 history=DEFAULT_JOB_HISTORY):
+        self.converter = converter or PDFConverter()
+        self.render_processes = render_processes
+        self.history = history
+        self._own_pool = False
+        if render_processes and self.converter.process_pool is None:
+            self.converter.process_pool = self._start_process_pool()
+            self._own_pool = True
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs or os.cpu_count() or 1,
+                                            thread_name_prefix="conversion")
+        self._jobs = OrderedDict()   # 任务ID -> ConversionJob，按提交顺序
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _start_process_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.render_processes)
+        list(pool.map(_warm_up, range(self.render_processes)))
+        return pool
+
+    def submit(self, pdf_path, output_dir, format='PNG', dpi=200,
+               progress_callback=None, **options):
+        """提交一个转换任务，立即返回 ConversionJob
+
+        其余参数与 PDFConverter.convert_pdf_to_images 相同（cancel_event 由任务提供）；
+        使用常驻进程池且未指定 workers 时按进程池大小并行渲染。
+        progress_callback(当前页数, 总页数) 在服务线程中调用。
+        """
+        if self.render_processes:
+            options.setdefault('workers', self.render_processes)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("转换服务已关闭")
+            job = ConversionJob(f"job-{next(self._ids)}", pdf_path, output_dir)
+            job.future = self._executor.submit(self._run, job, format, dpi,
+                                               progress_callback, options)
+            self._jobs[job.id] = job
+            self._trim_history()
+        return job
+
+    def _run(self, job, format, dpi, progress_callback, options):
+        job.started_at = time.time()
+        process_pool = self.converter.process_pool
+
+        def on_page(current, total):
+            job.done_pages, job.total_pages = current, total
+            if progress_callback:
+                progress_callback(current, total)
+
+        try:
+            if job.cancel_event.is_set():
+                raise ConversionCancelled(f"转换已取消: {job.pdf_path}")
+            logger.info(f"[{job.id}] 开始转换: {job.pdf_path}")
+            saved_files = self.converter.convert_pdf_to_images(
+                job.pdf_path, job.output_dir, format, dpi,
+                progress_callback=on_page, cancel_event=job.cancel_event, **options
+            )
+            logger.info(f"[{job.id}] 完成，共 {len(saved_files)} 个文件")
+            return saved_files
+        except BrokenProcessPool:
+            logger.error(f"[{job.id}] 渲染进程池已损坏，重新创建")
+            self._restart_process_pool(process_pool)
+            raise
+        finally:
+            job.finished_at = time.time()
+
+    def _restart_process_pool(self, broken_pool):
+        """替换损坏的进程池；多个任务同时发现损坏时只重建一次"""
+        with self._lock:
+            if (not self._own_pool or self._closed
+                    or self.converter.process_pool is not broken_pool):
+                return
+            self.converter.process_pool = self._start_process_pool()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _trim_history(self):
+        """淘汰最早结束的任务，直到已结束任务数不超过 history（调用方持有锁）"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.future.done()]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def get_job(self, job_id):
+        """按ID返回任务，不存在（或已被淘汰）时抛出 KeyError"""
+        with self._lock:
+            return self._jobs[job_id]
+
+    def status(self, job_id):
+        return self.get_job(job_id).info()
+
+    def cancel(self, job_id):
+        self.get_job(job_id).cancel()
+
+    def result(self, job_id, timeout=None):
+        return self.get_job(job_id).result(timeout)
+
+    def jobs(self):
+        """全部保留任务的状态列表，按提交顺序"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.info() for job in jobs]
+
+    def shutdown(self, wait_jobs=True, cancel_pending=False):
+        """关闭服务：不再接受新任务；cancel_pending 为 True 时取消全部未完成任务"""
+        with self._lock:
+            self._closed = True
+            jobs = list(self._jobs.values())
+        if cancel_pending:
+            for job in jobs:
+                job.cancel()
+        self._executor.shutdown(wait=wait_jobs, cancel_futures=cancel_pending)
+        if self._own_pool:
+            self.converter.process_pool.shutdown(wait=wait_jobs, cancel_futures=True)
@@ -0,0 +1,133 @@
+import json
+import hashlib
+import threading
+
+# 命名编码配置：各格式传给 Image.save 的参数，以及单色页面的处理方式
+#   monochrome 为 None 时不检测；'gray' 将三通道完全相同的页面保存为灰度（无损）；
+#   'bilevel' 另将近似纯黑白的页面阈值化保存为1位图（TIFF使用Group4压缩）
+ENCODING_PROFILES = {
+    'fast': {
+        'PNG': {'compress_level': 1},
+        'JPEG': {'quality': 85},
+        'TIFF': {'compression': 'packbits'},
+        'monochrome': None,
+    },
+    'balanced': {
+        'PNG': {'compress_level': 6},
+        'JPEG': {'quality': 90, 'optimize': True},
+        'TIFF': {'compression': 'tiff_lzw'},
+        'monochrome': 'gray',
+    },
+    'smallest': {
+        'PNG': {'compress_level': 9, 'optimize': True},
+        'JPEG': {'quality': 80, 'optimize': True, 'progressive': True,
+                 'subsampling': '4:2:0'},
+        'TIFF': {'compression': 'tiff_adobe_deflate'},
+        'monochrome': 'bilevel',
+    },
+}
+# 界面显示名称
+ENCODING_PROFILE_LABELS = {
+    'fast': '快速',
+    'balanced': '均衡',
+    'smallest': '最小体积',
+}
+# 灰度值在 [MARGIN, 255-MARGIN) 之间的像素占比不超过该值时视为纯黑白页面
+BILEVEL_GRAY_MARGIN = 32
+BILEVEL_MAX_GRAY_RATIO = 0.02
+
+
+def get_encoding_profile(encoding):
+    """按名称取编码配置；也可直接传入与 ENCODING_PROFILES 结构相同的字典"""
+    if isinstance(encoding, dict):
+        return encoding
+    try:
+        return ENCODING_PROFILES[encoding]
+    except KeyError:
+        raise ValueError(f"未知的编码配置: {encoding}") from None
+
+
+def encoding_variant(encoding):
+    """编码配置在渲染缓存键中的标识：命名配置用名称，自定义配置用内容摘要"""
+    if encoding is None:
+        return ''
+    if isinstance(encoding, dict):
+        digest = hashlib.sha1(json.dumps(encoding, sort_keys=True).encode('utf-8'))
+        return f"custom-{digest.hexdigest()[:12]}"
+    return encoding
+
+
+def to_monochrome(image, level):
+    """单色页面转换为灰度或1位图，返回新图片；非单色页面返回 None"""
+    from PIL import Image, ImageChops
+
+    if image.mode == '1':
+        return None
+    if image.mode == 'L':
+        gray = image.copy()
+    elif image.mode == 'RGB':
+        red, green, blue = image.split()
+        if (ImageChops.difference(red, green).getbbox()
+                or ImageChops.difference(green, blue).getbbox()):
+            return None
+        gray = red
+    else:
+        return None
+
+    if level == 'bilevel':
+        histogram = gray.histogram()
+        mid_tones = sum(histogram[BILEVEL_GRAY_MARGIN:256 - BILEVEL_GRAY_MARGIN])
+        if mid_tones <= sum(histogram) * BILEVEL_MAX_GRAY_RATIO:
+            return gray.convert('1', dither=Image.NONE)
+    return gray
+
+
+def prepare_image(image, format, encoding):
+    """按编码配置准备待保存的图片，返回 (图片, Image.save 参数)"""
+    profile = get_encoding_profile(encoding)
+    format = format.upper()
+    options = dict(profile.get(format, {}))
+
+    if profile.get('monochrome'):
+        converted = to_monochrome(image, profile['monochrome'])
+        if converted is not None:
+            image = converted
+    if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('L' if image.mode == '1' else 'RGB')
+    if format == 'TIFF' and image.mode == '1':
+        options['compression'] = 'group4'
+    return image, options
+
+
+class EncodeStats:
+    """编码统计：写出的页数、字节数和Pillow编码用时
+
+    由pdftoppm直接写出的页面只计入页数和字节数。
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.bytes_written = 0
+        self.encode_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, nbytes, seconds=0.0):
+        with self._lock:
+            self.pages += 1
+            self.bytes_written += nbytes
+            self.encode_seconds += seconds
+
+    def merge(self, snapshot):
+        """合并另一个统计的 snapshot()（如进程池子进程返回的结果）"""
+        with self._lock:
+            self.pages += snapshot['pages']
+            self.bytes_written += snapshot['bytes_written']
+            self.encode_seconds += snapshot['encode_seconds']
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pages': self.pages,
+                'bytes_written': self.bytes_written,
+                'encode_seconds': self.encode_seconds,
+            }
@@ -1,14 +1,22 @@
 import os
 import sys
+import time
+import threading
 from pathlib import Path
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QPushButton, QLabel, QLineEdit, QProgressBar,
                              QComboBox, QSpinBox, QCheckBox, QFileDialog,
-                             QMessageBox, QListWidget, QGroupBox, QTextEdit,
+                             QMessageBox, QListWidget, QGroupBox, QPlainTextEdit,
                              QSplitter, QTabWidget)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon
-from pdf_converter import PDFConverter
+from pdf_converter import PDFConverter, SUPPORTED_FORMATS
+from encoder_profiles import ENCODING_PROFILE_LABELS, EncodeStats
+from utils import validate_page_selection, format_file_size
+from log_setup import RateLimiter
+
+# 日志面板最多保留的行数，超出后丢弃最早的行
+LOG_MAX_LINES = 2000
 
 class ConversionThread(QThread):
     """转换线程，避免界面冻结"""
@@ -16,32 +24,114 @@ class ConversionThread(QThread):
     finished = pyqtSignal(list)      # 保存的文件列表
     error = pyqtSignal(str)         # 错误信息
     
-    def __init__(self, pdf_path, output_dir, format, dpi, prefix):
+    def __init__(self, pdf_path, output_dir, format, dpi, prefix, pages=None,
+                 encoding=None, converter=None):
         super().__init__()
         self.pdf_path = pdf_path
         self.output_dir = output_dir
         self.format = format
         self.dpi = dpi
         self.prefix = prefix
-        self.converter = PDFConverter()
+        self.pages = pages
+        self.encoding = encoding
+        self.encode_stats = EncodeStats()
+        # 复用主窗口的转换器，文档索引和压缩率模型在多次转换间保留
+        self.converter = converter or PDFConverter()
     
     def run(self):
         try:
             saved_files = self.converter.convert_pdf_to_images(
                 self.pdf_path, self.output_dir, self.format, 
-                self.dpi, self.prefix, self.progress.emit
+                self.dpi, self.prefix, self.progress.emit,
+                pages=self.pages, encoding=self.encoding,
+                encode_stats=self.encode_stats
             )
             self.finished.emit(saved_files)
         except Exception as e:
             self.error.emit(str(e))
 
+class BatchConversionThread(QThread):
+    """批量转换线程，通过信号报告整体进度、单文件进度和速度"""
+    file_progress = pyqtSignal(str, int, int)     # 文件路径，已完成页数，总页数
+    overall_progress = pyqtSignal(int, int)       # 已完成文件数，总文件数
+    speed = pyqtSignal(float)                     # 每秒页数
+    file_finished = pyqtSignal(dict)              # 单个文件的结果记录
+    finished = pyqtSignal(list)                   # 全部结果（按输入顺序）
+    error = pyqtSignal(str)                       # 错误信息
+    
+    def __init__(self, pdf_files, output_dir, format, dpi, pages=None,
+                 encoding=None, converter=None):
+        super().__init__()
+        from batch_scheduler import BatchScheduler
+        from manifest import ConversionManifest
+        
+        self.pdf_files = pdf_files
+        self.output_dir = output_dir
+        self.format = format
+        self.dpi = dpi
+        self.pages = pages
+        # 清单记录已完成的页面，中断后再次转换同一批文件时自动跳过
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = ConversionManifest.for_output_dir(output_dir)
+        self.scheduler = BatchScheduler(converter or PDFConverter(),
+                                        manifest=self.manifest, encoding=encoding)
+        self._pages_done = 0
+        self._pages_lock = threading.Lock()
+        self._start_time = None
+    
+    def cancel(self):
+        """取消尚未完成的文件，进行中的文件在当前页保存后停止"""
+        self.scheduler.cancel()
+    
+    def _on_page(self, pdf_file, current, total):
+        # 在调度器工作线程中调用，信号会排队投递到界面线程
+        with self._pages_lock:
+            self._pages_done += 1
+            pages_done = self._pages_done
+        elapsed = time.monotonic() - self._start_time
+        self.file_progress.emit(pdf_file, current, total)
+        if elapsed > 0:
+            self.speed.emit(pages_done / elapsed)
+    
+    def run(self):
+        try:
+            self._start_time = time.monotonic()
+            total_files = len(self.pdf_files)
+            results = [None] * total_files
+            done_files = 0
+            
+            for index, result in self.scheduler.run(
+                    self.pdf_files, self.output_dir, self.format, self.dpi,
+                    self._on_page, with_index=True, pages=self.pages):
+                results[index] = result
+                done_files += 1
+                self.file_finished.emit(result)
+                self.overall_progress.emit(done_files, total_files)
+            
+            self.finished.emit(results)
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            self.manifest.close()
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.converter = PDFConverter()
+        self._converter = None
         self.current_pdf_path = None
         self.init_ui()
     
+    @property
+    def converter(self):
+        """转换后端在首次使用时才创建"""
+        if self._converter is None:
+            self._converter = PDFConverter()
+        return self._converter
+    
+    def init_backend(self):
+        """窗口显示后再初始化转换后端并预加载PDF依赖"""
+        self.converter.preload()
+    
     def init_ui(self):
         self.setWindowTitle("PDF转图片工具 v1.0")
         self.setGeometry(100, 100, 800, 600)
@@ -70,8 +160,9 @@ class MainWindow(QMainWindow):
         # 日志显示
         log_group = QGroupBox("操作日志")
         log_layout = QVBoxLayout()
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_MAX_LINES)
         self.log_text.setMaximumHeight(150)
         log_layout.addWidget(self.log_text)
         log_group.setLayout(log_layout)
@@ -122,10 +213,14 @@ class MainWindow(QMainWindow):
         format_layout = QHBoxLayout()
         format_layout.addWidget(QLabel("输出格式:"))
         self.format_combo = QComboBox()
-        self.format_combo.addItems(self.converter.supported_formats)
+        self.format_combo.addItems(SUPPORTED_FORMATS)
         self.format_combo.setCurrentText('PNG')
         format_layout.addWidget(self.format_combo)
         
+        format_layout.addWidget(QLabel("编码:"))
+        self.encoding_combo = self.create_encoding_combo()
+        format_layout.addWidget(self.encoding_combo)
+        
         format_layout.addWidget(QLabel("DPI:"))
         self.dpi_spin = QSpinBox()
         self.dpi_spin.setRange(72, 600)
@@ -143,6 +238,14 @@ class MainWindow(QMainWindow):
         prefix_layout.addWidget(self.prefix_edit)
         settings_layout.addLayout(prefix_layout)
         
+        # 页码范围
+        pages_layout = QHBoxLayout()
+        pages_layout.addWidget(QLabel("页码范围:"))
+        self.pages_edit = QLineEdit()
+        self.pages_edit.setPlaceholderText("留空转换全部页面，如 1-5,9 或 last")
+        pages_layout.addWidget(self.pages_edit)
+        settings_layout.addLayout(pages_layout)
+        
         settings_group.setLayout(settings_layout)
         layout.addWidget(settings_group)
         
@@ -208,10 +311,14 @@ class MainWindow(QMainWindow):
         batch_format_layout = QHBoxLayout()
         batch_format_layout.addWidget(QLabel("输出格式:"))
         self.batch_format_combo = QComboBox()
-        self.batch_format_combo.addItems(self.converter.supported_formats)
+        self.batch_format_combo.addItems(SUPPORTED_FORMATS)
         self.batch_format_combo.setCurrentText('PNG')
         batch_format_layout.addWidget(self.batch_format_combo)
         
+        batch_format_layout.addWidget(QLabel("编码:"))
+        self.batch_encoding_combo = self.create_encoding_combo()
+        batch_format_layout.addWidget(self.batch_encoding_combo)
+        
         batch_format_layout.addWidget(QLabel("DPI:"))
         self.batch_dpi_spin = QSpinBox()
         self.batch_dpi_spin.setRange(72, 600)
@@ -221,17 +328,50 @@ class MainWindow(QMainWindow):
         batch_format_layout.addStretch()
         batch_settings_layout.addLayout(batch_format_layout)
         
+        batch_pages_layout = QHBoxLayout()
+        batch_pages_layout.addWidget(QLabel("页码范围:"))
+        self.batch_pages_edit = QLineEdit()
+        self.batch_pages_edit.setPlaceholderText("留空转换全部页面，如 1 表示只转换首页")
+        batch_pages_layout.addWidget(self.batch_pages_edit)
+        batch_settings_layout.addLayout(batch_pages_layout)
+        
         batch_settings_group.setLayout(batch_settings_layout)
         layout.addWidget(batch_settings_group)
         
+        # 批量进度
+        self.batch_progress_bar = QProgressBar()
+        self.batch_progress_bar.setVisible(False)
+        layout.addWidget(self.batch_progress_bar)
+        
+        self.batch_status_label = QLabel("")
+        self.batch_status_label.setVisible(False)
+        layout.addWidget(self.batch_status_label)
+        
         # 批量转换按钮
+        batch_buttons_layout = QHBoxLayout()
         self.batch_convert_btn = QPushButton("开始批量转换")
         self.batch_convert_btn.clicked.connect(self.start_batch_conversion)
         self.batch_convert_btn.setEnabled(False)
-        layout.addWidget(self.batch_convert_btn)
+        batch_buttons_layout.addWidget(self.batch_convert_btn)
+        
+        self.batch_cancel_btn = QPushButton("取消")
+        self.batch_cancel_btn.clicked.connect(self.cancel_batch_conversion)
+        self.batch_cancel_btn.setEnabled(False)
+        batch_buttons_layout.addWidget(self.batch_cancel_btn)
+        layout.addLayout(batch_buttons_layout)
         
         layout.addStretch()
     
+    def create_encoding_combo(self):
+        """编码配置下拉框：默认（Pillow默认参数）、快速、均衡、最小体积"""
+        combo = QComboBox()
+        combo.addItem("默认", None)
+        for name, label in ENCODING_PROFILE_LABELS.items():
+            combo.addItem(label, name)
+        combo.setToolTip("快速：编码最快；均衡：压缩与速度兼顾；"
+                         "最小体积：最高压缩，单色页面自动保存为灰度或黑白图")
+        return combo
+    
     def browse_pdf_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "选择PDF文件", "", "PDF文件 (*.pdf)"
@@ -257,6 +397,7 @@ class MainWindow(QMainWindow):
             info = self.converter.get_pdf_info(pdf_path)
             if info:
                 info_text = (f"页数: {info['page_count']} | "
+                           f"扫描页: {info['scanned_pages']} | "
                            f"标题: {info['title']} | "
                            f"作者: {info['author']} | "
                            f"文件大小: {info['file_size'] / 1024:.1f} KB")
@@ -277,13 +418,20 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "请设置输出目录")
             return
         
+        pages = self.read_page_selection(self.pages_edit)
+        if pages is False:
+            return
+        
         # 创建转换线程
         self.conversion_thread = ConversionThread(
             self.current_pdf_path,
             output_dir,
             self.format_combo.currentText(),
             self.dpi_spin.value(),
-            self.prefix_edit.text().strip() or None
+            self.prefix_edit.text().strip() or None,
+            pages,
+            self.encoding_combo.currentData(),
+            self.converter
         )
         
         # 连接信号
@@ -295,15 +443,30 @@ class MainWindow(QMainWindow):
         self.convert_btn.setEnabled(False)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
+        self.progress_log = RateLimiter()
         
         # 开始转换
         self.conversion_thread.start()
         self.log_message("开始转换PDF文件...")
     
+    def read_page_selection(self, edit):
+        """读取页码范围输入：留空返回 None，格式错误时提示并返回 False"""
+        spec = edit.text().strip()
+        if not spec:
+            return None
+        try:
+            validate_page_selection(spec)
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", f"页码范围无效: {e}")
+            return False
+        return spec
+    
     def update_progress(self, current, total):
         progress = int((current / total) * 100)
         self.progress_bar.setValue(progress)
-        self.log_message(f"转换进度: {current}/{total} 页")
+        # 进度条每页更新，日志按时间间隔输出，避免大文档刷满日志面板
+        if self.progress_log.ready(force=current == total):
+            self.log_message(f"转换进度: {current}/{total} 页")
     
     def conversion_finished(self, saved_files):
         self.convert_btn.setEnabled(True)
@@ -312,6 +475,7 @@ class MainWindow(QMainWindow):
         msg = f"转换完成！共生成 {len(saved_files)} 个图片文件"
         QMessageBox.information(self, "完成", msg)
         self.log_message(msg)
+        self.log_encode_stats(self.conversion_thread.encode_stats)
         
         # 打开输出目录
         output_dir = self.output_dir.text().strip()
@@ -368,38 +532,122 @@ class MainWindow(QMainWindow):
         # 获取文件列表
         pdf_files = [self.file_list.item(i).text() for i in range(self.file_list.count())]
         
-        # 执行批量转换
-        try:
-            results = self.converter.batch_convert(
-                pdf_files,
-                output_dir,
-                self.batch_format_combo.currentText(),
-                self.batch_dpi_spin.value()
+        pages = self.read_page_selection(self.batch_pages_edit)
+        if pages is False:
+            return
+        
+        # 创建批量转换线程
+        self.batch_thread = BatchConversionThread(
+            pdf_files,
+            output_dir,
+            self.batch_format_combo.currentText(),
+            self.batch_dpi_spin.value(),
+            pages,
+            self.batch_encoding_combo.currentData(),
+            self.converter
+        )
+        
+        # 连接信号
+        self.batch_thread.file_progress.connect(self.update_batch_file_progress)
+        self.batch_thread.overall_progress.connect(self.update_batch_progress)
+        self.batch_thread.speed.connect(self.update_batch_speed)
+        self.batch_thread.file_finished.connect(self.batch_file_finished)
+        self.batch_thread.finished.connect(self.batch_conversion_finished)
+        self.batch_thread.error.connect(self.batch_conversion_error)
+        
+        # 更新UI状态
+        self.batch_convert_btn.setEnabled(False)
+        self.batch_cancel_btn.setEnabled(True)
+        self.batch_progress_bar.setVisible(True)
+        self.batch_progress_bar.setRange(0, len(pdf_files))
+        self.batch_progress_bar.setValue(0)
+        self.batch_status_label.setVisible(True)
+        self.batch_status_label.setText("准备中...")
+        self.batch_file_text = ""
+        self.batch_speed_text = ""
+        
+        # 开始批量转换
+        self.batch_thread.start()
+        self.log_message(f"开始批量转换 {len(pdf_files)} 个文件...")
+    
+    def cancel_batch_conversion(self):
+        if getattr(self, 'batch_thread', None) and self.batch_thread.isRunning():
+            self.batch_thread.cancel()
+            self.batch_cancel_btn.setEnabled(False)
+            self.batch_status_label.setText("正在取消，等待当前页面完成...")
+            self.log_message("已请求取消批量转换")
+    
+    def update_batch_progress(self, done, total):
+        self.batch_progress_bar.setValue(done)
+    
+    def update_batch_file_progress(self, pdf_file, current, total):
+        self.batch_file_text = f"{Path(pdf_file).name}: {current}/{total} 页"
+        self._refresh_batch_status()
+    
+    def update_batch_speed(self, pages_per_second):
+        self.batch_speed_text = f"{pages_per_second:.1f} 页/秒"
+        self._refresh_batch_status()
+    
+    def _refresh_batch_status(self):
+        if self.batch_cancel_btn.isEnabled():
+            self.batch_status_label.setText(
+                " | ".join(t for t in (self.batch_file_text, self.batch_speed_text) if t)
             )
-            
-            # 统计结果
-            success_count = sum(1 for r in results if r['status'] == 'success')
-            failed_count = len(results) - success_count
-            
-            msg = f"批量转换完成！成功: {success_count}, 失败: {failed_count}"
-            QMessageBox.information(self, "完成", msg)
-            self.log_message(msg)
-            
-            # 显示失败的文件
-            if failed_count > 0:
-                failed_files = [r['input_file'] for r in results if r['status'] == 'failed']
-                self.log_message("失败文件:\n" + "\n".join(failed_files))
-            
-            # 打开输出目录
-            if os.path.exists(output_dir):
-                os.startfile(output_dir)
-                
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"批量转换失败:\n{str(e)}")
-            self.log_message(f"批量转换失败: {str(e)}")
+    
+    def batch_file_finished(self, result):
+        name = Path(result['input_file']).name
+        if result['status'] == 'success':
+            self.log_message(f"完成: {name} ({len(result['output_files'])} 页)")
+        elif result['status'] == 'failed':
+            self.log_message(f"失败: {name} - {result['error']}")
+        else:
+            self.log_message(f"已取消: {name}")
+    
+    def _reset_batch_ui(self):
+        self.batch_convert_btn.setEnabled(self.file_list.count() > 0)
+        self.batch_cancel_btn.setEnabled(False)
+        self.batch_progress_bar.setVisible(False)
+        self.batch_status_label.setVisible(False)
+    
+    def batch_conversion_finished(self, results):
+        self._reset_batch_ui()
+        
+        # 统计结果
+        success_count = sum(1 for r in results if r['status'] == 'success')
+        failed_count = sum(1 for r in results if r['status'] == 'failed')
+        cancelled_count = len(results) - success_count - failed_count
+        
+        msg = f"批量转换完成！成功: {success_count}, 失败: {failed_count}"
+        if cancelled_count:
+            msg += f", 已取消: {cancelled_count}"
+        QMessageBox.information(self, "完成", msg)
+        self.log_message(msg)
+        self.log_encode_stats(self.batch_thread.scheduler.encode_stats)
+        
+        # 显示失败的文件
+        if failed_count > 0:
+            failed_files = [r['input_file'] for r in results if r['status'] == 'failed']
+            self.log_message("失败文件:\n" + "\n".join(failed_files))
+        
+        # 打开输出目录
+        output_dir = self.batch_output_dir.text().strip()
+        if success_count and os.path.exists(output_dir):
+            os.startfile(output_dir)
+    
+    def batch_conversion_error(self, error_msg):
+        self._reset_batch_ui()
+        
+        QMessageBox.critical(self, "错误", f"批量转换失败:\n{error_msg}")
+        self.log_message(f"批量转换失败: {error_msg}")
+    
+    def log_encode_stats(self, encode_stats):
+        stats = encode_stats.snapshot()
+        if stats['pages']:
+            self.log_message(f"写出 {format_file_size(stats['bytes_written'])}，"
+                             f"编码用时 {stats['encode_seconds']:.2f} 秒")
     
     def log_message(self, message):
-        self.log_text.append(f"[{self.get_current_time()}] {message}")
+        self.log_text.appendPlainText(f"[{self.get_current_time()}] {message}")
     
     def get_current_time(self):
         from datetime import datetime
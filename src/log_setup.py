@@ -0,0 +1,66 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# 日志文件轮转：单个文件上限和保留的历史文件数
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 5
+# 逐页进度日志的最小输出间隔（秒）
+PROGRESS_LOG_INTERVAL = 2.0
+
+
+def setup_logging(level=logging.INFO, log_file=None, console=True,
+                  max_bytes=DEFAULT_LOG_MAX_BYTES, backup_count=DEFAULT_LOG_BACKUP_COUNT):
+    """配置异步日志，返回已启动的 QueueListener
+
+    根记录器只挂一个 QueueHandler，格式化以及写文件、写控制台都在后台监听线程中完成，
+    转换线程记录日志时不会阻塞在磁盘或控制台I/O上。log_file 按 max_bytes 轮转，
+    保留 backup_count 个历史文件。程序退出时自动停止监听线程并写完剩余日志。
+    进程池子进程不继承监听线程，其中的日志不会输出。
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                            backupCount=backup_count, encoding='utf-8'))
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class RateLimiter:
+    """限制高频日志或界面刷新的频率
+
+    ready() 距上次返回 True 超过 interval 秒时返回 True；force 为 True 时（如最后一页）
+    总是返回 True。第一次调用总是返回 True。
+    """
+
+    def __init__(self, interval=PROGRESS_LOG_INTERVAL):
+        self.interval = interval
+        self._last = None
+        self._lock = threading.Lock()
+
+    def ready(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if force or self._last is None or now - self._last >= self.interval:
+                self._last = now
+                return True
+            return False
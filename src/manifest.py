@@ -0,0 +1,88 @@
+import os
+import json
+import threading
+import logging
+from encoder_profiles import encoding_variant
+
+logger = logging.getLogger(__name__)
+
+# 清单文件名，位于批量输出目录下
+MANIFEST_NAME = ".conversion_manifest.jsonl"
+
+
+def _input_signature(pdf_path):
+    """输入文件的标识：绝对路径、修改时间和大小，任一变化都视为新文件"""
+    stat = os.stat(pdf_path)
+    return os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size
+
+
+class ConversionManifest:
+    """记录已完成页面的持久化清单（JSON Lines，只追加）
+
+    每保存一页追加一行记录，中断后重新运行时可跳过输入未变化、DPI、格式和编码配置均相同
+    且输出文件仍存在的页面。输出文件通过临时文件加重命名原子写入，清单中出现的页面一定是完整文件。
+    """
+
+    def __init__(self, path, reset=False):
+        """reset 为 True 时忽略并清空已有记录，重新开始"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._pages = {}   # (输入标识, dpi, 格式, 编码配置) -> {页码: 输出路径}
+        if not reset:
+            self._load()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'w' if reset else 'a', encoding='utf-8')
+        if self._file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # 上次崩溃留下不完整的最后一行，另起一行继续追加
+                    self._file.write("\n")
+
+    @classmethod
+    def for_output_dir(cls, output_dir, reset=False):
+        return cls(os.path.join(output_dir, MANIFEST_NAME), reset=reset)
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能不完整，忽略即可
+                    continue
+                # 早期记录没有 encoding 字段，当时只有Pillow默认编码
+                key = ((record['input'], record['mtime'], record['size']),
+                       record['dpi'], record['format'], record.get('encoding', ''))
+                self._pages.setdefault(key, {})[record['page']] = record['output']
+
+    def completed_pages(self, pdf_path, dpi, format, encoding=None):
+        """返回该文件在相同设置下已完成且输出仍存在的 {页码: 输出路径}"""
+        key = (_input_signature(pdf_path), dpi, format.upper(), encoding_variant(encoding))
+        with self._lock:
+            pages = dict(self._pages.get(key, {}))
+        # 分块渲染的页面输出为目录
+        return {page: path for page, path in pages.items() if os.path.exists(path)}
+
+    def record_page(self, pdf_path, page_number, output_path, dpi, format,
+                    encoding=None):
+        """记录一页已完成，立即刷新到磁盘"""
+        signature = _input_signature(pdf_path)
+        record = {
+            'input': signature[0], 'mtime': signature[1], 'size': signature[2],
+            'dpi': dpi, 'format': format.upper(), 'encoding': encoding_variant(encoding),
+            'page': page_number, 'output': os.path.abspath(output_path),
+        }
+        key = (signature, dpi, record['format'], record['encoding'])
+        with self._lock:
+            self._pages.setdefault(key, {})[page_number] = record['output']
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._file.close()
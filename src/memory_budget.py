@@ -0,0 +1,80 @@
+import math
+import threading
+from contextlib import contextmanager
+
+# 8位RGB位图每像素字节数
+PIXEL_BYTES = 3
+# poppler输出缓冲、PIL位图以及格式转换副本带来的额外开销系数
+OVERHEAD_FACTOR = 2
+
+
+class MemoryBudgetError(Exception):
+    """单页栅格化所需内存超过预算"""
+
+
+def estimate_raster_bytes(width_pt, height_pt, dpi):
+    """由页面尺寸（点）和DPI估算单页位图的字节数"""
+    return math.ceil(width_pt / 72 * dpi) * math.ceil(height_pt / 72 * dpi) * PIXEL_BYTES
+
+
+def estimate_page_peak(width_pt, height_pt, dpi):
+    """估算渲染并保存单页时的峰值内存"""
+    return estimate_raster_bytes(width_pt, height_pt, dpi) * OVERHEAD_FACTOR
+
+
+def plan_for_budget(page_peak, budget, chunk_size, workers, encoder_threads):
+    """在内存预算内选择渲染参数
+
+    page_peak 为待渲染页面中最大的单页峰值估算。内存中同时存在的页面数为
+    每个进程的渲染窗口（加上流水线队列）乘以进程数，据此缩小窗口、进程数和编码线程数。
+    返回 (chunk_size, workers, encoder_threads, queue_size)。
+    """
+    if page_peak > budget:
+        raise MemoryBudgetError("单页所需内存超过预算")
+
+    pages_fit = max(1, budget // page_peak)
+    workers = max(1, min(workers, pages_fit))
+    per_worker = max(1, pages_fit // workers)
+    chunk_size = min(chunk_size or per_worker, per_worker)
+
+    queue_size = None
+    if workers == 1 and encoder_threads > 1:
+        # 流水线：一个渲染窗口加编码队列中的页面
+        if per_worker < 2:
+            encoder_threads = 1
+        else:
+            chunk_size = max(1, min(chunk_size, per_worker // 2))
+            queue_size = per_worker - chunk_size
+            encoder_threads = min(encoder_threads, queue_size)
+    return chunk_size, workers, encoder_threads, queue_size
+
+
+class MemoryBudget:
+    """多个任务共享的内存预算
+
+    任务开始前按估算峰值预留字节数，预算不足时阻塞等待其他任务归还。
+    超过总预算的预留按总预算计，保证单个任务总能独占运行。
+    """
+
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self._available = total_bytes
+        self._condition = threading.Condition()
+
+    @property
+    def available(self):
+        with self._condition:
+            return self._available
+
+    @contextmanager
+    def reserve(self, nbytes):
+        nbytes = min(nbytes, self.total_bytes)
+        with self._condition:
+            self._condition.wait_for(lambda: self._available >= nbytes)
+            self._available -= nbytes
+        try:
+            yield nbytes
+        finally:
+            with self._condition:
+                self._available += nbytes
+                self._condition.notify_all()
@@ -0,0 +1,216 @@
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 转换阶段：解析文档、栅格化、颜色模式转换、编码、写盘
+STAGES = ('parse', 'rasterize', 'convert', 'encode', 'write')
+# 单页各阶段耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _empty_histogram(buckets):
+    return {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(buckets) + 1)}
+
+
+class StageTimings:
+    """单个转换任务的分阶段耗时
+
+    每个阶段保存一个按页的耗时直方图；snapshot() 是普通字典，可从进程池子进程返回后 merge()。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, count=1):
+        """记录一次耗时；count 为这段时间处理的页数（按页均摊计入直方图）"""
+        if count <= 0:
+            return
+        per_page = seconds / count
+        index = bisect.bisect_left(self.buckets, per_page)
+        with self._lock:
+            histogram = self._stages.setdefault(stage, _empty_histogram(self.buckets))
+            histogram['count'] += count
+            histogram['sum'] += seconds
+            histogram['buckets'][index] += count
+
+    @contextmanager
+    def time(self, stage, count=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, count)
+
+    def merge(self, snapshot):
+        with self._lock:
+            for stage, other in snapshot.items():
+                histogram = self._stages.setdefault(stage, _empty_histogram(self.buckets))
+                histogram['count'] += other['count']
+                histogram['sum'] += other['sum']
+                for index, value in enumerate(other['buckets']):
+                    histogram['buckets'][index] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: {'count': h['count'], 'sum': h['sum'], 'buckets': list(h['buckets'])}
+                    for stage, h in self._stages.items()}
+
+    def totals(self):
+        """各阶段总耗时（秒）"""
+        with self._lock:
+            return {stage: h['sum'] for stage, h in self._stages.items()}
+
+
+class ConversionMetrics:
+    """转换指标汇总，可由多个转换器共用
+
+    累计各阶段单页耗时直方图、按状态统计的文档数、页数、写出字节数和文档总耗时，
+    可导出为Prometheus文本格式或JSON。传入 hook 时每个文档完成后以事件字典调用：
+    {'input_file', 'status', 'pages', 'seconds', 'stages': {阶段: 秒}, 'bytes_written'}。
+    hook 在转换线程中调用，应尽快返回。
+    """
+
+    def __init__(self, hook=None, buckets=DEFAULT_BUCKETS):
+        self.hook = hook
+        self.buckets = tuple(buckets)
+        self._stages = StageTimings(self.buckets)
+        self._documents = {}      # 状态 -> 文档数
+        self._document_seconds = _empty_histogram(self.buckets)
+        self._pages = 0
+        self._bytes_written = 0
+        self._lock = threading.Lock()
+
+    def new_job(self):
+        """为一次转换创建分阶段计时器"""
+        return StageTimings(self.buckets)
+
+    def record_document(self, pdf_path, status, pages, seconds, timings,
+                        bytes_written=0):
+        """记录一个文档的转换（批量任务中各页面块汇总后记录一次）"""
+        self._stages.merge(timings.snapshot())
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._documents[status] = self._documents.get(status, 0) + 1
+            self._document_seconds['count'] += 1
+            self._document_seconds['sum'] += seconds
+            self._document_seconds['buckets'][index] += 1
+            self._pages += pages
+            self._bytes_written += bytes_written
+
+        if self.hook is not None:
+            try:
+                self.hook({
+                    'input_file': pdf_path, 'status': status, 'pages': pages,
+                    'seconds': seconds, 'stages': timings.totals(),
+                    'bytes_written': bytes_written,
+                })
+            except Exception as e:
+                logger.warning(f"指标回调失败: {e}")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'documents': dict(self._documents),
+                'pages': self._pages,
+                'bytes_written': self._bytes_written,
+                'document_seconds': {
+                    'count': self._document_seconds['count'],
+                    'sum': self._document_seconds['sum'],
+                    'buckets': list(self._document_seconds['buckets']),
+                },
+                'stages': self._stages.snapshot(),
+                'bucket_bounds': list(self.buckets),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """导出Prometheus文本格式"""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP pdf_to_image_documents_total 已处理的文档数",
+            "# TYPE pdf_to_image_documents_total counter",
+        ]
+        for status, count in sorted(snapshot['documents'].items()):
+            lines.append(f'pdf_to_image_documents_total{{status="{status}"}} {count}')
+        lines += [
+            "# HELP pdf_to_image_pages_total 已转换的页数",
+            "# TYPE pdf_to_image_pages_total counter",
+            f"pdf_to_image_pages_total {snapshot['pages']}",
+            "# HELP pdf_to_image_written_bytes_total 写出的字节数",
+            "# TYPE pdf_to_image_written_bytes_total counter",
+            f"pdf_to_image_written_bytes_total {snapshot['bytes_written']}",
+            "# HELP pdf_to_image_stage_seconds 各阶段耗时（解析按文档计，其余按页计）",
+            "# TYPE pdf_to_image_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(snapshot['stages'].items()):
+            lines += self._histogram_lines("pdf_to_image_stage_seconds", histogram,
+                                           f'stage="{stage}"')
+        lines += [
+            "# HELP pdf_to_image_document_seconds 单个文档的转换总耗时",
+            "# TYPE pdf_to_image_document_seconds histogram",
+        ]
+        lines += self._histogram_lines("pdf_to_image_document_seconds",
+                                       snapshot['document_seconds'])
+        return "\n".join(lines) + "\n"
+
+    def _histogram_lines(self, name, histogram, labels=''):
+        lines = []
+        cumulative = 0
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for bound, value in zip(bounds, histogram['buckets']):
+            cumulative += value
+            bucket_labels = f'{labels},le="{bound}"' if labels else f'le="{bound}"'
+            lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {histogram['sum']:.6f}")
+        lines.append(f"{name}_count{suffix} {histogram['count']}")
+        return lines
+
+    def write(self, path):
+        """写出指标文件：扩展名为 .prom 或 .txt 时为Prometheus文本格式，否则为JSON"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+@contextmanager
+def capture_profile(profile_path=None, trace_memory=False, top=20):
+    """对一次任务采集 cProfile 和/或 tracemalloc 数据，产出的字典在结束后填入结果
+
+    profile_path 不为空时启用cProfile，结束后写出可用 pstats/snakeviz 查看的统计文件；
+    cProfile 只采集调用线程，编码线程和渲染子进程中的耗时不计入，分析时可使用单进程
+    单编码线程。trace_memory 为 True 时用 tracemalloc 跟踪全部线程的Python内存分配，
+    结束后填入 'memory_peak'（字节）和分配最多的 top 个代码位置 'memory_top'。
+    """
+    import cProfile
+    import tracemalloc
+
+    report = {}
+    profiler = cProfile.Profile() if profile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            report['profile_path'] = profile_path
+            logger.info(f"cProfile 统计已写入: {profile_path}")
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:top]
+            tracemalloc.stop()
+            report['memory_peak'] = peak
+            report['memory_top'] = [str(stat) for stat in statistics]
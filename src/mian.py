@@ -1,20 +1,19 @@
 import sys
 import os
 import logging
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
 from gui import MainWindow
-
-# 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("pdf_converter.log"),
-        logging.StreamHandler()
-    ]
-)
+from log_setup import setup_logging
 
 def main():
+    # 打包后的exe启动多进程渲染时需要
+    multiprocessing.freeze_support()
+    
+    # 设置日志：写盘在后台线程中进行，日志文件按大小轮转
+    setup_logging(logging.INFO, log_file="pdf_converter.log")
+    
     # 创建应用目录
     os.makedirs("output", exist_ok=True)
     
@@ -25,6 +24,9 @@ def main():
     window = MainWindow()
     window.show()
     
+    # 窗口显示后再加载转换后端依赖
+    QTimer.singleShot(0, window.init_backend)
+    
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
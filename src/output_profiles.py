@@ -0,0 +1,147 @@
+import os
+import math
+from encoder_profiles import get_encoding_profile
+from memory_budget import PIXEL_BYTES
+from utils import DEFAULT_COMPRESSION_RATIOS, OUTPUT_SAFETY_FACTOR
+
+# 只指定最大边长的配置在无法读取页面尺寸时使用的渲染DPI
+DEFAULT_PROFILE_DPI = 200
+
+
+def normalize_profiles(profiles, output_dir, output_prefix, supported_formats):
+    """校验输出配置并补全默认值
+
+    每个配置是一个字典：
+        name      配置名（必填，各配置不能重复）
+        format    输出格式（默认 PNG）
+        dpi       输出DPI
+        max_size  输出图片最长边的像素上限；与 dpi 同时指定时先按DPI缩放再限制边长
+        quality   JPEG质量（1-95），优先于编码配置中的质量
+        encoding  编码配置名（见 encoder_profiles），默认使用Pillow默认参数
+        prefix    输出文件名前缀（默认与单次转换相同）
+        subfolder 输出子目录（默认为配置名，空字符串表示直接写入 output_dir）
+    dpi 和 max_size 至少指定一个。返回补全了 output_dir、prefix 和 save_options 的新列表。
+    """
+    if not profiles:
+        raise ValueError("至少需要一个输出配置")
+
+    normalized = []
+    names = set()
+    for profile in profiles:
+        name = profile.get('name')
+        if not name:
+            raise ValueError(f"输出配置缺少名称: {profile}")
+        if name in names:
+            raise ValueError(f"输出配置名称重复: {name}")
+        names.add(name)
+
+        format = profile.get('format', 'PNG').upper()
+        if format not in supported_formats:
+            raise ValueError(f"输出配置 {name} 的格式不受支持: {format}")
+        dpi = profile.get('dpi')
+        max_size = profile.get('max_size')
+        if not dpi and not max_size:
+            raise ValueError(f"输出配置 {name} 需要指定 dpi 或 max_size")
+        if (dpi is not None and dpi <= 0) or (max_size is not None and max_size <= 0):
+            raise ValueError(f"输出配置 {name} 的 dpi 和 max_size 必须为正数")
+
+        save_options = {}
+        quality = profile.get('quality')
+        if quality is not None:
+            if not 1 <= quality <= 95:
+                raise ValueError(f"输出配置 {name} 的质量应在 1-95 之间: {quality}")
+            if format == 'JPEG':
+                save_options['quality'] = quality
+
+        encoding = profile.get('encoding')
+        if encoding is not None:
+            get_encoding_profile(encoding)
+
+        subfolder = profile.get('subfolder', name)
+        normalized.append({
+            'name': name,
+            'format': format,
+            'dpi': dpi,
+            'max_size': max_size,
+            'quality': quality,
+            'encoding': encoding,
+            'prefix': profile.get('prefix') or output_prefix,
+            'output_dir': os.path.join(output_dir, subfolder) if subfolder else output_dir,
+            'save_options': save_options,
+        })
+    return normalized
+
+
+def render_dpi_for_profiles(profiles, page_sizes=None):
+    """选择唯一一次渲染使用的DPI：满足所有配置中要求最高的一个
+
+    只指定 max_size 的配置按所选页面中最短的长边计算所需DPI，保证每页都能缩放到
+    max_size；page_sizes 为 None（页面尺寸未知）时使用 DEFAULT_PROFILE_DPI。
+    """
+    dpi = max((profile['dpi'] for profile in profiles if profile['dpi']), default=0)
+    size_only = [profile['max_size'] for profile in profiles if not profile['dpi']]
+    if size_only:
+        if page_sizes:
+            longest_side = min(max(size) for size in page_sizes)
+            dpi = max(dpi, math.ceil(max(size_only) * 72 / longest_side))
+        else:
+            dpi = max(dpi, DEFAULT_PROFILE_DPI)
+    return dpi
+
+
+def profile_size(image_size, profile, render_dpi):
+    """由渲染得到的位图尺寸计算该配置的输出尺寸（只缩小，不放大）"""
+    width, height = image_size
+    if profile['dpi'] and profile['dpi'] < render_dpi:
+        scale = profile['dpi'] / render_dpi
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    max_size = profile['max_size']
+    if max_size and max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    return width, height
+
+
+def estimate_profiles_output_bytes(profiles, page_sizes, render_dpi, model=None):
+    """估算全部配置的输出总字节数（含安全系数）
+
+    page_sizes 为各页尺寸（点）；每个配置按自己的DPI或 max_size 计算输出像素数，
+    再乘以该配置格式和编码配置的压缩率（model 为 utils.CompressionModel，None 时用默认值）。
+    """
+    ratios = []
+    for profile in profiles:
+        if model is not None:
+            ratios.append(model.ratio(profile['format'], profile['encoding']))
+        else:
+            ratios.append(DEFAULT_COMPRESSION_RATIOS.get(profile['format'], 1.0))
+
+    total = 0
+    for width_pt, height_pt in page_sizes:
+        image_size = (math.ceil(width_pt / 72 * render_dpi),
+                      math.ceil(height_pt / 72 * render_dpi))
+        for profile, ratio in zip(profiles, ratios):
+            width, height = profile_size(image_size, profile, render_dpi)
+            total += width * height * PIXEL_BYTES * ratio
+    return math.ceil(total * OUTPUT_SAFETY_FACTOR)
+
+
+def parse_profile_spec(spec):
+    """解析命令行输出配置 "名称:格式:DPI[:质量]"，DPI 写作 "200px" 时表示最长边像素数
+
+    例如 "master:PNG:300"、"preview:JPEG:150:85"、"thumb:JPEG:200px"。
+    """
+    parts = spec.split(':')
+    if len(parts) not in (3, 4) or not parts[0]:
+        raise ValueError(f"无效的输出配置（应为 名称:格式:DPI[:质量]）: {spec}")
+    name, format, size = parts[0], parts[1].upper(), parts[2].strip().lower()
+    profile = {'name': name, 'format': format}
+    try:
+        if size.endswith('px'):
+            profile['max_size'] = int(size[:-2])
+        else:
+            profile['dpi'] = int(size)
+        if len(parts) == 4:
+            profile['quality'] = int(parts[3])
+    except ValueError:
+        raise ValueError(f"无效的输出配置（DPI和质量应为整数）: {spec}") from None
+    return profile
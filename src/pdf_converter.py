@@ -1,43 +1,435 @@
+import io
 import os
+import time
+import queue
+import shutil
 import tempfile
+import itertools
+import collections
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_path
-from PIL import Image
 import logging
+from utils import (parse_page_selection, format_file_size, DEFAULT_DISK_RESERVE,
+                   CompressionModel, estimate_output_bytes, check_output_space)
+from pdf_index import DocumentIndex
+from memory_budget import (MemoryBudgetError, estimate_page_peak, estimate_raster_bytes,
+                           plan_for_budget)
+from encoder_profiles import EncodeStats, encoding_variant, prepare_image
+from log_setup import RateLimiter
+
+# PyPDF2、pdf2image、PIL 和进程池均在首次使用时才导入，以缩短启动时间
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_FORMATS = ('PNG', 'JPEG', 'BMP', 'TIFF')
+
+# 流式渲染时每次交给poppler的页数（渲染窗口）
+DEFAULT_CHUNK_SIZE = 10
+# 渲染/编码流水线中的编码线程数
+DEFAULT_ENCODER_THREADS = min(4, os.cpu_count() or 1)
+# pdftoppm 可直接写出的格式 -> pdf2image 的 fmt 参数
+_POPPLER_FORMATS = {'PNG': 'png', 'JPEG': 'jpeg', 'TIFF': 'tiff'}
+
+
+class ConversionCancelled(Exception):
+    """转换任务被取消"""
+
+
+def _page_windows(pages, chunk_size):
+    """将有序页码列表按连续区间切分为不超过 chunk_size 页的 (起始页, 结束页) 渲染窗口"""
+    windows = []
+    for page in pages:
+        if (windows and page == windows[-1][1] + 1
+                and (not chunk_size or chunk_size <= 0
+                     or page - windows[-1][0] < chunk_size)):
+            windows[-1][1] = page
+        else:
+            windows.append([page, page])
+    return [tuple(window) for window in windows]
+
+
+def _chain_pages(*sources):
+    """依次产出各来源的 (页码, 输出路径)；提前关闭时一并关闭各来源生成器"""
+    try:
+        for source in sources:
+            yield from source
+    finally:
+        for source in sources:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+
+
+def _output_path(output_dir, output_prefix, page_number, format):
+    """按 {prefix}_page_{NNN} 规则生成单页输出路径"""
+    output_filename = f"{output_prefix}_page_{page_number:03d}.{format.lower()}"
+    return os.path.join(output_dir, output_filename)
+
+
+def _tiled_output_path(output_dir, output_prefix, page_number, tile_output):
+    """分块渲染页面的输出路径：'tiff' 为分块TIFF文件，'tiles' 为分块图片目录"""
+    if tile_output == 'tiff':
+        return _output_path(output_dir, output_prefix, page_number, 'TIFF')
+    return os.path.join(output_dir, f"{output_prefix}_page_{page_number:03d}_tiles")
+
+
+def _save_page(image, output_dir, output_prefix, page_number, format,
+               save_options=None, encoding=None, stats=None, timings=None):
+    """保存单页图片，返回输出路径
+    
+    encoding 为编码配置名（见 encoder_profiles），None 时使用Pillow默认参数；
+    save_options 为额外传给 Image.save 的参数，优先于编码配置。
+    传入 EncodeStats 时记录写出字节数和编码用时；传入 StageTimings 时分别记录
+    颜色转换、编码和写盘耗时（此时先编码到内存再写盘，以便区分后两个阶段）。
+    """
+    output_path = _output_path(output_dir, output_prefix, page_number, format)
+    start = time.perf_counter()
+    
+    if encoding is not None:
+        image, options = prepare_image(image, format, encoding)
+    else:
+        options = {}
+        if format.upper() == 'JPEG':
+            image = image.convert('RGB')  # JPEG需要RGB模式
+    options.update(save_options or {})
+    converted = encoded = time.perf_counter()
+    
+    # 先写入同目录下的临时文件再重命名：中断时不会留下看似完整的残缺图片，
+    # 也不会改写与渲染缓存共享硬链接的旧文件
+    temp_path = f"{output_path}.part"
+    try:
+        if timings is None:
+            image.save(temp_path, format=format, **options)
+        else:
+            buffer = io.BytesIO()
+            image.save(buffer, format=format, **options)
+            encoded = time.perf_counter()
+            with open(temp_path, 'wb') as f:
+                f.write(buffer.getbuffer())
+            del buffer
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finished = time.perf_counter()
+    if timings is not None:
+        timings.observe('convert', converted - start)
+        timings.observe('encode', encoded - converted)
+        timings.observe('write', finished - encoded)
+    if stats is not None:
+        stats.add(os.path.getsize(output_path), finished - start)
+    return output_path
+
+
+def _rasterize(pdf_path, dpi, first_page, last_page, timings=None, **kwargs):
+    """调用poppler渲染一个页面窗口，传入 StageTimings 时记录栅格化耗时"""
+    from pdf2image import convert_from_path
+    
+    start = time.perf_counter()
+    result = convert_from_path(pdf_path, dpi=dpi, first_page=first_page,
+                               last_page=last_page, **kwargs)
+    if timings is not None:
+        timings.observe('rasterize', time.perf_counter() - start,
+                        last_page - first_page + 1)
+    return result
+
+
+def _iter_window_pages(pdf_path, output_dir, output_prefix, format, dpi,
+                       first_page, last_page, encoding=None, stats=None,
+                       timings=None):
+    """渲染一个页面窗口并逐页保存，依次产出 (页码, 输出路径)"""
+    images = _rasterize(pdf_path, dpi, first_page, last_page, timings)
+    page_number = first_page
+    
+    # 逐页弹出，保存后即释放该页位图
+    while images:
+        image = images.pop(0)
+        output_path = _save_page(image, output_dir, output_prefix,
+                                 page_number, format, encoding=encoding,
+                                 stats=stats, timings=timings)
+        image.close()
+        yield page_number, output_path
+        page_number += 1
+
+
+def _iter_direct_pages(pdf_path, output_dir, output_prefix, format, dpi,
+                       first_page, last_page, stats=None, timings=None):
+    """由pdftoppm直接写出目标格式，再按命名规则重命名，依次产出 (页码, 输出路径)
+    
+    页面数据不经过PIL解码和重新编码。先写入输出目录下的临时子目录（同一文件系统），
+    再逐个 os.replace 到最终文件名，保证输出文件原子出现。
+    pdftoppm的编码和写盘耗时计入栅格化阶段。
+    """
+    temp_dir = tempfile.mkdtemp(prefix=".render-", dir=output_dir)
+    try:
+        paths = _rasterize(pdf_path, dpi, first_page, last_page, timings,
+                           output_folder=temp_dir, output_file="page",
+                           fmt=_POPPLER_FORMATS[format.upper()],
+                           paths_only=True)
+        if len(paths) != last_page - first_page + 1:
+            raise RuntimeError(f"pdftoppm 输出页数不符: 第 {first_page}-{last_page} 页"
+                               f"得到 {len(paths)} 个文件")
+        
+        # pdftoppm 按页码补零命名，排序后即为页码顺序
+        for page_number, path in zip(range(first_page, last_page + 1), paths):
+            output_path = _output_path(output_dir, output_prefix, page_number, format)
+            os.replace(path, output_path)
+            if stats is not None:
+                stats.add(os.path.getsize(output_path))
+            yield page_number, output_path
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _render_window(pdf_path, output_dir, output_prefix, format, dpi,
+                   first_page, last_page, direct=False, encoding=None,
+                   with_timings=False):
+    """进程池任务：渲染并保存一个页面窗口
+    
+    返回 ([(页码, 输出路径), ...], 编码统计 snapshot, 分阶段耗时 snapshot 或 None)。
+    """
+    from metrics import StageTimings
+    
+    stats = EncodeStats()
+    timings = StageTimings() if with_timings else None
+    job = (pdf_path, output_dir, output_prefix, format, dpi, first_page, last_page)
+    if direct:
+        pages = list(_iter_direct_pages(*job, stats=stats, timings=timings))
+    else:
+        pages = list(_iter_window_pages(*job, encoding=encoding, stats=stats,
+                                        timings=timings))
+    return pages, stats.snapshot(), timings.snapshot() if timings else None
+
+
+def _encode_page(image, output_dir, output_prefix, page_number, format,
+                 encoding=None, stats=None, timings=None):
+    """编码线程任务：保存单页并释放位图"""
+    try:
+        return _save_page(image, output_dir, output_prefix, page_number, format,
+                          encoding=encoding, stats=stats, timings=timings)
+    finally:
+        image.close()
+
+
+def _iter_pipelined_pages(pdf_path, output_dir, output_prefix, format, dpi,
+                          windows, encoder_threads, queue_size=None,
+                          encoding=None, stats=None, timings=None):
+    """渲染/编码流水线，按页码顺序产出 (页码, 输出路径)"""
+    def encode(image, page_number):
+        return _encode_page(image, output_dir, output_prefix, page_number, format,
+                            encoding=encoding, stats=stats, timings=timings)
+    
+    return _iter_encoded_pages(pdf_path, dpi, windows, encode,
+                               encoder_threads, queue_size, timings)
+
+
+def _iter_encoded_pages(pdf_path, dpi, windows, encode, encoder_threads,
+                        queue_size=None, timings=None):
+    """逐窗口渲染并由 encode(image, page_number) 处理各页，按页码顺序产出 (页码, 结果)
+    
+    后台线程逐窗口渲染并把页面交给编码线程池（Pillow编码时释放GIL），
+    两者通过有界队列连接：队列满时渲染暂停，内存中最多保留一个窗口加 queue_size 页。
+    encode 负责释放传入的位图。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    queue_size = queue_size or encoder_threads * 2
+    pending = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=encoder_threads)
+    end_marker = object()
+    
+    def put(item):
+        # 消费方提前结束时不再阻塞
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for first_page, last_page in windows:
+                images = _rasterize(pdf_path, dpi, first_page, last_page, timings)
+                for page_number in range(first_page, last_page + 1):
+                    image = images.pop(0)
+                    future = executor.submit(encode, image, page_number)
+                    if not put((page_number, future)):
+                        return
+            put(end_marker)
+        except BaseException as e:
+            put(e)
+    
+    producer = threading.Thread(target=produce, name="pdf-render", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is end_marker:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            page_number, future = item
+            yield page_number, future.result()
+    finally:
+        stop.set()
+        producer.join()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _save_profiles(image, page_number, profiles, render_dpi, stats=None,
+                   timings=None):
+    """编码线程任务：按各输出配置缩放并保存同一页，返回 {配置名: 输出路径}"""
+    from output_profiles import profile_size
+    from PIL import Image
+    
+    try:
+        outputs = {}
+        for profile in profiles:
+            size = profile_size(image.size, profile, render_dpi)
+            if size == image.size:
+                resized = image
+            else:
+                # reducing_gap 先按整数倍快速缩小再精细重采样，大幅缩小时更快
+                start = time.perf_counter()
+                resized = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+                if timings is not None:
+                    timings.observe('convert', time.perf_counter() - start)
+            try:
+                outputs[profile['name']] = _save_page(
+                    resized, profile['output_dir'], profile['prefix'], page_number,
+                    profile['format'], profile['save_options'],
+                    encoding=profile['encoding'], stats=stats, timings=timings)
+            finally:
+                if resized is not image:
+                    resized.close()
+        return outputs
+    finally:
+        image.close()
+
+
+def _log_encode_stats(stats):
+    snapshot = stats.snapshot()
+    if snapshot['pages']:
+        logger.info(f"写出 {snapshot['pages']} 个文件，共 {format_file_size(snapshot['bytes_written'])}，"
+                    f"编码用时 {snapshot['encode_seconds']:.2f} 秒")
+
+
+class _ConversionJob:
+    """一次转换调用的编码统计、分阶段耗时和已完成页数（见 PDFConverter._conversion_job）"""
+    
+    def __init__(self, name, timings=None, cancel_event=None):
+        self.name = name
+        self.stats = EncodeStats()
+        self.timings = timings
+        self.cancel_event = cancel_event
+        self.pages_done = 0
+        self.start = time.perf_counter()
+    
+    def iter_encoded(self, pdf_path, dpi, pages, chunk_size, encode, encoder_threads):
+        """按 chunk_size 页一个窗口渲染选中页面并交给 encode，见 _iter_encoded_pages"""
+        return _iter_encoded_pages(pdf_path, dpi, _page_windows(pages, chunk_size),
+                                   encode, max(1, encoder_threads), timings=self.timings)
+    
+    def check_cancelled(self, rendered):
+        """cancel_event 已设置时关闭页面来源并抛出 ConversionCancelled"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            rendered.close()
+            raise ConversionCancelled(f"转换已取消: {self.name}")
+
+
 class PDFConverter:
-    def __init__(self):
-        self.supported_formats = ['PNG', 'JPEG', 'BMP', 'TIFF']
+    """PDF转图片转换器
+    
+    转换状态都保存在每次调用的局部变量中，缓存、索引、指标和压缩率模型均自带锁，
+    同一实例可被多个线程同时调用（输出目录和文件名前缀不应重叠）。
+    """
+    
+    def __init__(self, cache=None, index=None, metrics=None, size_model=None,
+                 disk_reserve=DEFAULT_DISK_RESERVE, process_pool=None):
+        self.supported_formats = list(SUPPORTED_FORMATS)
+        # 可选的 RenderCache，命中的页面直接从缓存生成输出文件而不重新渲染
+        self.cache = cache
+        # 文档索引：页数、页面尺寸和扫描页标记，按文件缓存
+        self.index = index or DocumentIndex()
+        # 可选的 ConversionMetrics，记录每次转换的分阶段耗时（解析、栅格化、颜色转换、
+        # 编码、写盘）和文档总耗时
+        self.metrics = metrics
+        # 压缩率模型（utils.CompressionModel）：写出前估算输出字节数，转换完成后按实际
+        # 写出的字节数更新；disk_reserve 为写完预计输出后目标卷至少保留的可用空间
+        self.size_model = size_model or CompressionModel()
+        self.disk_reserve = disk_reserve
+        # 可选的常驻 ProcessPoolExecutor，多进程渲染时复用，不再每次转换创建和销毁进程池；
+        # 由调用方负责关闭
+        self.process_pool = process_pool
+    
+    def preload(self):
+        """预先导入渲染和解析依赖，可在界面显示后调用以避免首次转换时的停顿"""
+        import PyPDF2
+        import pdf2image
+        import PIL.Image
+        import concurrent.futures.process
     
     def get_pdf_info(self, pdf_path):
-        """获取PDF文件信息"""
+        """获取PDF文件信息（来自文档索引，文件未变化时不重复解析）"""
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PdfReader(file)
-                page_count = len(reader.pages)
-                
-                # 获取文档信息
-                info = reader.metadata
-                title = info.get('/Title', '未知标题')
-                author = info.get('/Author', '未知作者')
-                
-                return {
-                    'page_count': page_count,
-                    'title': title,
-                    'author': author,
-                    'file_size': os.path.getsize(pdf_path)
-                }
+            entry = self.index.get(pdf_path)
+            return {
+                'page_count': entry['page_count'],
+                'title': entry['title'],
+                'author': entry['author'],
+                'file_size': entry['file_size'],
+                'scanned_pages': sum(entry['scanned']),
+            }
         except Exception as e:
             logger.error(f"获取PDF信息失败: {e}")
             return None
     
-    def convert_pdf_to_images(self, pdf_path, output_dir, format='PNG', dpi=200, 
-                             output_prefix=None, progress_callback=None):
-        """将PDF转换为图片"""
+    def get_page_count(self, pdf_path):
+        """获取PDF页数（不渲染页面）；文档索引无法解析时退回poppler的pdfinfo"""
         try:
+            return self.index.get(pdf_path)['page_count']
+        except Exception as e:
+            logger.warning(f"文档索引解析失败，改用pdfinfo: {e}")
+        
+        from pdf2image import pdfinfo_from_path
+        
+        return int(pdfinfo_from_path(pdf_path)['Pages'])
+    
+    def convert_pdf_to_images(self, pdf_path, output_dir, format='PNG', dpi=200, 
+                             output_prefix=None, progress_callback=None,
+                             chunk_size=DEFAULT_CHUNK_SIZE, workers=1,
+                             pages=None, cancel_event=None, manifest=None,
+                             encoder_threads=DEFAULT_ENCODER_THREADS,
+                             direct_to_disk=True, memory_budget=None,
+                             tile_output=None, encoding=None, encode_stats=None,
+                             max_output_bytes=None, timings=None):
+        """将PDF转换为图片，返回按页码排序的输出路径列表
+        
+        output_prefix: 输出文件名前缀，默认为PDF文件名
+        progress_callback: 每保存一页调用 progress_callback(已完成页数, 总页数)
+        chunk_size: 每个渲染窗口的页数，None 或 0 时一次渲染整个文档
+        workers: 大于1时各窗口在进程池中并行渲染
+        pages: 页码列表或页码选择字符串（如 "1-5,9"、"last"），默认全部页面
+        cancel_event: 被设置后在下一页前抛出 ConversionCancelled
+        manifest: ConversionManifest，跳过其中已完成的页面并记录新完成的页面
+        encoder_threads: 单进程渲染时保存页面的编码线程数
+        direct_to_disk: PNG/JPEG/TIFF 由pdftoppm直接写出，不经PIL重新编码
+        memory_budget: 内存上限（字节），据此缩小窗口和并发，单页超出时抛出 MemoryBudgetError
+        tile_output: 单页超出内存预算时分块输出为 'tiff' 文件或 'tiles' 目录
+        encoding: 编码配置名（见 encoder_profiles），None 为Pillow默认参数
+        encode_stats: EncodeStats，累计写出的字节数和编码用时
+        max_output_bytes: 预计输出上限（字节），超出或目标卷空间不足时抛出 DiskSpaceError
+        timings: StageTimings，传入时耗时累计到其中，文档指标由调用方记录
+        """
+        saved_pages = []
+        progress_log = RateLimiter()
+        with self._conversion_job(pdf_path, cancel_event, encode_stats, timings) as job:
+            stats, timings = job.stats, job.timings
             # 验证输入文件
             if not os.path.isfile(pdf_path):
                 raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
@@ -51,59 +443,571 @@ class PDFConverter:
             
             # 转换PDF为图片
             logger.info(f"开始转换PDF: {pdf_path}")
-            images = convert_from_path(pdf_path, dpi=dpi)
+            pages = self._resolve_pages(pdf_path, pages, timings)
+            total_pages = len(pages)
+            
+            # 跳过清单中已完成的页面（断点续转）
+            resumed_results = []
+            render_pages = pages
+            if manifest is not None:
+                completed = manifest.completed_pages(pdf_path, dpi, format, encoding)
+                render_pages = []
+                for page_number in pages:
+                    # 上次分块渲染的页面记录的是分块TIFF或分块目录
+                    candidates = [
+                        _output_path(output_dir, output_prefix, page_number, format),
+                        _tiled_output_path(output_dir, output_prefix, page_number, 'tiff'),
+                        _tiled_output_path(output_dir, output_prefix, page_number, 'tiles'),
+                    ]
+                    recorded = completed.get(page_number)
+                    output_path = next((path for path in candidates
+                                        if recorded == os.path.abspath(path)), None)
+                    if output_path is not None:
+                        resumed_results.append((page_number, output_path))
+                    else:
+                        render_pages.append(page_number)
+                if resumed_results:
+                    logger.info(f"跳过已完成的 {len(resumed_results)}/{total_pages} 页")
+            resumed_pages = {page_number for page_number, _ in resumed_results}
             
-            saved_files = []
-            total_pages = len(images)
+            # 预检输出空间：缓存命中以硬链接生成时不占空间，取缓存后只检查未命中的页面；
+            # 需要复制缓存文件时命中的页面同样要写出，在取缓存前检查
+            cache_links = self.cache is not None and self.cache.links_to(output_dir)
+            if not cache_links:
+                self._preflight(pdf_path, render_pages, output_dir, dpi, format, encoding,
+                                max_output_bytes)
             
-            for i, image in enumerate(images):
-                # 生成输出文件名
-                output_filename = f"{output_prefix}_page_{i+1:03d}.{format.lower()}"
-                output_path = os.path.join(output_dir, output_filename)
+            # 再从渲染缓存取出已有页面，只渲染未命中的页面
+            cached_results, cache_keys = [], {}
+            if self.cache is not None:
+                document_hash = self.cache.document_hash(pdf_path)
+                pending_pages, render_pages = render_pages, []
+                for page_number in pending_pages:
+                    key = self.cache.page_key(document_hash, page_number, dpi, format,
+                                              encoding_variant(encoding))
+                    output_path = _output_path(output_dir, output_prefix,
+                                               page_number, format)
+                    if self.cache.fetch(key, output_path):
+                        cached_results.append((page_number, output_path))
+                    else:
+                        cache_keys[page_number] = key
+                        render_pages.append(page_number)
+                if cached_results:
+                    logger.info(f"渲染缓存命中 {len(cached_results)}/{total_pages} 页")
+            if cache_links:
+                self._preflight(pdf_path, render_pages, output_dir, dpi, format, encoding,
+                                max_output_bytes)
+            
+            queue_size = None
+            tiled_pages = []
+            if memory_budget and render_pages:
+                plan, tiled_pages = self._plan_memory(
+                    pdf_path, render_pages, dpi, memory_budget,
+                    chunk_size, workers, encoder_threads, tile_output
+                )
+                chunk_size, workers, encoder_threads, queue_size = plan
+                render_pages = [page for page in render_pages if page not in tiled_pages]
+                # 分块输出的格式和布局与缓存键不符，不写入渲染缓存
+                for page_number in tiled_pages:
+                    cache_keys.pop(page_number, None)
+            
+            if workers > 1 and not chunk_size:
+                # 未指定窗口大小时按进程数均分页面
+                chunk_size = -(-len(render_pages) // workers) or None
+            windows = _page_windows(render_pages, chunk_size)
+            
+            render_args = (pdf_path, output_dir, output_prefix, format, dpi)
+            direct = (direct_to_disk and encoding is None
+                      and format.upper() in _POPPLER_FORMATS)
+            if workers > 1 and len(windows) > 1:
+                rendered = self._render_parallel(render_args, windows, workers, direct,
+                                                 encoding, stats, timings)
+            elif direct:
+                rendered = (item for window in windows
+                            for item in _iter_direct_pages(*render_args, *window,
+                                                           stats=stats,
+                                                           timings=timings))
+            elif encoder_threads > 1 and len(render_pages) > 1:
+                rendered = _iter_pipelined_pages(*render_args, windows, encoder_threads,
+                                                 queue_size, encoding, stats, timings)
+            else:
+                rendered = (item for window in windows
+                            for item in _iter_window_pages(*render_args, *window,
+                                                           encoding=encoding,
+                                                           stats=stats,
+                                                           timings=timings))
+            if tiled_pages:
+                tiled = self._iter_tiled_pages(pdf_path, output_dir, output_prefix,
+                                               dpi, format, tiled_pages, tile_output,
+                                               memory_budget, max(workers, encoder_threads))
+                rendered = _chain_pages(rendered, tiled)
+            page_results = itertools.chain(resumed_results, cached_results, rendered)
+            
+            for page_number, output_path in page_results:
+                saved_pages.append((page_number, output_path))
+                job.pages_done += 1
+                if page_number in cache_keys and os.path.isfile(output_path):
+                    self.cache.store(cache_keys[page_number], output_path)
+                if manifest is not None and page_number not in resumed_pages:
+                    manifest.record_page(pdf_path, page_number, output_path,
+                                         dpi, format, encoding)
                 
-                # 保存图片
-                if format.upper() == 'JPEG':
-                    image = image.convert('RGB')  # JPEG需要RGB模式
+                # 更新进度
+                if progress_callback:
+                    progress_callback(job.pages_done, total_pages)
                 
-                image.save(output_path, format=format)
-                saved_files.append(output_path)
+                # 逐页日志按时间间隔合并，避免大文档的日志I/O拖慢转换
+                if progress_log.ready(force=job.pages_done == total_pages):
+                    logger.info(f"已保存 {job.pages_done}/{total_pages} 页"
+                                f"（最近: 第 {page_number} 页 {output_path}）")
                 
-                # 更新进度
+                job.check_cancelled(rendered)
+            
+            logger.info(f"转换完成，共 {total_pages} 页")
+            self._learn_output_size(pdf_path, render_pages, dpi, format, encoding, stats)
+        return [output_path for _, output_path in sorted(saved_pages)]
+    
+    def convert_with_profiles(self, pdf_path, output_dir, profiles,
+                              output_prefix=None, progress_callback=None,
+                              chunk_size=DEFAULT_CHUNK_SIZE, pages=None,
+                              cancel_event=None,
+                              encoder_threads=DEFAULT_ENCODER_THREADS,
+                              encode_stats=None, max_output_bytes=None):
+        """一次渲染生成多种输出（如300 DPI原图、150 DPI预览和200像素缩略图）
+        
+        每页只按所有配置中要求最高的分辨率渲染一次，其余配置在内存中缩小后保存，
+        各配置使用自己的格式、质量、文件名前缀和子目录（配置字段见
+        output_profiles.normalize_profiles）。pages、progress_callback、cancel_event
+        与 convert_pdf_to_images 相同，进度按页计算（一页的全部配置保存后回调一次）。
+        写出前按各配置的DPI或最长边、格式和压缩率估算全部输出的字节数，超过
+        max_output_bytes 或目标卷空间不足时抛出 DiskSpaceError。
+        返回 {配置名: 按页码排序的输出路径列表}。
+        """
+        from output_profiles import (normalize_profiles, render_dpi_for_profiles,
+                                     estimate_profiles_output_bytes)
+        
+        progress_log = RateLimiter()
+        with self._conversion_job(pdf_path, cancel_event, encode_stats) as job:
+            if not os.path.isfile(pdf_path):
+                raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
+            if output_prefix is None:
+                output_prefix = Path(pdf_path).stem
+            profiles = normalize_profiles(profiles, output_dir, output_prefix,
+                                          self.supported_formats)
+            
+            logger.info(f"开始转换PDF: {pdf_path}（{len(profiles)} 种输出）")
+            pages = self._resolve_pages(pdf_path, pages, job.timings)
+            total_pages = len(pages)
+            try:
+                page_sizes = self.index.get(pdf_path)['page_sizes']
+                page_sizes = [page_sizes[page - 1] for page in pages]
+            except Exception as e:
+                logger.warning(f"无法读取页面尺寸: {e}")
+                page_sizes = None
+            render_dpi = render_dpi_for_profiles(profiles, page_sizes)
+            logger.info(f"按 {render_dpi} DPI 渲染一次，缩放生成其余输出")
+            
+            # 预检输出空间：全部配置的输出合计
+            if page_sizes is None:
+                logger.warning("页面尺寸未知，跳过输出空间检查")
+            else:
+                estimate = estimate_profiles_output_bytes(profiles, page_sizes, render_dpi,
+                                                          self.size_model)
+                free = check_output_space(output_dir, estimate, self.disk_reserve,
+                                          max_output_bytes)
+                if free is not None:
+                    logger.info(f"预计输出 {format_file_size(estimate)}，"
+                                f"可用空间 {format_file_size(free)}")
+            for profile in profiles:
+                os.makedirs(profile['output_dir'], exist_ok=True)
+            
+            def encode(image, page_number):
+                return _save_profiles(image, page_number, profiles, render_dpi,
+                                      job.stats, job.timings)
+            
+            rendered = job.iter_encoded(pdf_path, render_dpi, pages, chunk_size,
+                                        encode, encoder_threads)
+            results = {profile['name']: [] for profile in profiles}
+            for page_number, outputs in rendered:
+                for name, output_path in outputs.items():
+                    results[name].append(output_path)
+                job.pages_done += 1
                 if progress_callback:
-                    progress_callback(i + 1, total_pages)
+                    progress_callback(job.pages_done, total_pages)
                 
-                logger.info(f"已保存第 {i+1} 页: {output_path}")
+                if progress_log.ready(force=job.pages_done == total_pages):
+                    logger.info(f"已保存 {job.pages_done}/{total_pages} 页"
+                                f"（每页 {len(outputs)} 种输出，最近: 第 {page_number} 页）")
+                
+                job.check_cancelled(rendered)
             
             logger.info(f"转换完成，共 {total_pages} 页")
-            return saved_files
+        return results
+    
+    def convert_pdf_to_bundle(self, pdf_path, output_path, format='PNG', dpi=200,
+                              bundle=None, output_prefix=None, progress_callback=None,
+                              chunk_size=DEFAULT_CHUNK_SIZE, pages=None,
+                              cancel_event=None,
+                              encoder_threads=DEFAULT_ENCODER_THREADS,
+                              encoding=None, encode_stats=None,
+                              max_output_bytes=None):
+        """将选中页面写入单个打包文件，返回输出路径
+        
+        bundle 为 'tiff' 时写出多页TIFF（format 固定为TIFF），为 'zip'/'tar' 时每页作为
+        {prefix}_page_{NNN}.{格式} 条目写入归档；默认按 output_path 的扩展名推断。
+        页面由渲染/编码流水线按页码顺序产出后立即追加，不先收集全部页面，
+        内存中最多保留一个渲染窗口加编码队列中的页面。pages、progress_callback、
+        cancel_event 和 encoding 与 convert_pdf_to_images 相同；失败或取消时不留下输出文件。
+        写出前同样检查 max_output_bytes 和目标卷空间，不足时抛出 DiskSpaceError。
+        """
+        from bundle_writer import BundleWriter, bundle_type_for_path, encode_page_bytes
+        
+        with self._conversion_job(pdf_path, cancel_event, encode_stats) as job:
+            if not os.path.isfile(pdf_path):
+                raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
+            bundle = bundle or bundle_type_for_path(output_path)
+            if bundle is None:
+                raise ValueError(f"无法从文件名推断打包方式: {output_path}")
+            if bundle == 'tiff':
+                format = 'TIFF'
+            if format.upper() not in SUPPORTED_FORMATS:
+                raise ValueError(f"不支持的输出格式: {format}")
+            if output_prefix is None:
+                output_prefix = Path(pdf_path).stem
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            
+            logger.info(f"开始转换PDF: {pdf_path} -> {output_path}")
+            pages = self._resolve_pages(pdf_path, pages, job.timings)
+            total_pages = len(pages)
+            self._preflight(pdf_path, pages, os.path.dirname(os.path.abspath(output_path)),
+                            dpi, format, encoding, max_output_bytes)
+            
+            if bundle == 'tiff':
+                # TIFF页面必须按顺序追加到同一文件，编码线程只做颜色模式转换
+                def encode(image, page_number):
+                    if encoding is None:
+                        return image, {}
+                    prepared, options = prepare_image(image, format, encoding)
+                    if prepared is not image:
+                        image.close()
+                    return prepared, options
+            else:
+                def encode(image, page_number):
+                    try:
+                        return encode_page_bytes(image, format, encoding)
+                    finally:
+                        image.close()
+            
+            rendered = job.iter_encoded(pdf_path, dpi, pages, chunk_size,
+                                        encode, encoder_threads)
+            writer = BundleWriter(output_path, bundle, dpi)
+            try:
+                for page_number, payload in rendered:
+                    if bundle == 'tiff':
+                        image, options = payload
+                        start = time.perf_counter()
+                        try:
+                            nbytes = writer.add_tiff_page(image, options)
+                        finally:
+                            image.close()
+                        seconds = time.perf_counter() - start
+                        job.stats.add(nbytes, seconds)
+                        if job.timings is not None:
+                            # TIFF帧的编码与写入在同一次调用中完成
+                            job.timings.observe('encode', seconds)
+                    else:
+                        data, seconds = payload
+                        name = os.path.basename(_output_path('', output_prefix,
+                                                             page_number, format))
+                        start = time.perf_counter()
+                        job.stats.add(writer.add_file(name, data), seconds)
+                        if job.timings is not None:
+                            job.timings.observe('encode', seconds)
+                            job.timings.observe('write', time.perf_counter() - start)
+                    job.pages_done += 1
+                    
+                    if progress_callback:
+                        progress_callback(job.pages_done, total_pages)
+                    
+                    job.check_cancelled(rendered)
+                writer.close()
+            except BaseException:
+                # 失败或取消时不留下输出文件
+                writer.abort()
+                raise
+            logger.info(f"转换完成，共 {total_pages} 页: {output_path}")
+        return output_path
+    
+    def convert_bytes_to_images(self, pdf_data, format='PNG', dpi=200,
+                                output_prefix='document', progress_callback=None,
+                                chunk_size=DEFAULT_CHUNK_SIZE, pages=None,
+                                cancel_event=None,
+                                encoder_threads=DEFAULT_ENCODER_THREADS,
+                                encoding=None, encode_stats=None,
+                                as_memoryview=False):
+        """在内存中转换PDF数据，按页码顺序逐页产出 (页码, 文件名, 图片数据)
+        
+        pdf_data 为 bytes 类对象或可读取的二进制流（如网络请求体）。文件名与
+        convert_pdf_to_images 的输出文件名相同（{prefix}_page_{NNN}.{格式}），pages、
+        progress_callback、cancel_event 和 encoding 的含义也相同；进度回调在产出该页之前调用。
+        图片编码在内存中完成，不写输出文件；as_memoryview 为 True 时产出指向编码缓冲区的
+        memoryview，不再复制。poppler只能读取文件，输入数据先写入一个临时文件，
+        整次转换共用并在结束时删除（pdf2image.convert_from_bytes 每次调用都会这样做）。
+        """
+        from bundle_writer import encode_page_bytes
+        
+        if format.upper() not in SUPPORTED_FORMATS:
+            raise ValueError(f"不支持的输出格式: {format}")
+        
+        fd, temp_path = tempfile.mkstemp(prefix="pdf-bytes-", suffix=".pdf")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(pdf_data, 'read'):
+                    shutil.copyfileobj(pdf_data, f)
+                else:
+                    f.write(pdf_data)
             
+            # 调用方提前停止迭代同样视为取消
+            with self._conversion_job(output_prefix, cancel_event, encode_stats) as job:
+                logger.info(f"开始转换内存中的PDF: {output_prefix}")
+                pages = self._resolve_pages(temp_path, pages, job.timings)
+                total_pages = len(pages)
+                
+                def encode(image, page_number):
+                    try:
+                        return encode_page_bytes(image, format, encoding,
+                                                 as_memoryview=as_memoryview)
+                    finally:
+                        image.close()
+                
+                rendered = job.iter_encoded(temp_path, dpi, pages, chunk_size,
+                                            encode, encoder_threads)
+                try:
+                    for page_number, (data, seconds) in rendered:
+                        job.stats.add(len(data), seconds)
+                        if job.timings is not None:
+                            job.timings.observe('encode', seconds)
+                        job.pages_done += 1
+                        if progress_callback:
+                            progress_callback(job.pages_done, total_pages)
+                        
+                        name = os.path.basename(_output_path('', output_prefix,
+                                                             page_number, format))
+                        yield page_number, name, data
+                        
+                        job.check_cancelled(rendered)
+                finally:
+                    rendered.close()
+                
+                logger.info(f"转换完成，共 {total_pages} 页")
+        finally:
+            os.remove(temp_path)
+    
+    @contextmanager
+    def _conversion_job(self, name, cancel_event=None, encode_stats=None, timings=None):
+        """各转换入口共用的任务框架，产出 _ConversionJob，结束时按结果记录一次文档指标"""
+        record = timings is None and self.metrics is not None
+        if record:
+            timings = self.metrics.new_job()
+        job = _ConversionJob(name, timings, cancel_event)
+        try:
+            yield job
+        except (ConversionCancelled, GeneratorExit) as e:
+            logger.info(str(e) or f"转换已停止: {name}")
+            if record:
+                self._record_metrics(job, 'cancelled')
+            raise
         except Exception as e:
             logger.error(f"PDF转换失败: {e}")
+            if record:
+                self._record_metrics(job, 'failed')
             raise
+        _log_encode_stats(job.stats)
+        if encode_stats is not None:
+            encode_stats.merge(job.stats.snapshot())
+        if record:
+            self._record_metrics(job, 'success')
+    
+    def _record_metrics(self, job, status):
+        self.metrics.record_document(job.name, status, job.pages_done,
+                                     time.perf_counter() - job.start, job.timings,
+                                     job.stats.snapshot()['bytes_written'])
     
-    def batch_convert(self, pdf_files, output_dir, format='PNG', dpi=200):
-        """批量转换多个PDF文件"""
-        results = []
-        total_files = len(pdf_files)
+    def _preflight(self, pdf_path, pages, output_dir, dpi, format, encoding=None,
+                   max_output_bytes=None):
+        """写出前估算输出字节数并检查目标卷空间，不足时抛出 DiskSpaceError
         
-        for i, pdf_file in enumerate(pdf_files):
-            try:
-                logger.info(f"处理文件 {i+1}/{total_files}: {pdf_file}")
-                output_subdir = os.path.join(output_dir, Path(pdf_file).stem)
-                saved_files = self.convert_pdf_to_images(
-                    pdf_file, output_subdir, format, dpi
-                )
-                results.append({
-                    'input_file': pdf_file,
-                    'output_files': saved_files,
-                    'status': 'success'
-                })
-            except Exception as e:
-                logger.error(f"处理文件失败 {pdf_file}: {e}")
-                results.append({
-                    'input_file': pdf_file,
-                    'error': str(e),
-                    'status': 'failed'
-                })
+        无法读取页面尺寸时跳过检查。返回预计输出字节数或 None。
+        """
+        if not pages:
+            return 0
+        try:
+            page_sizes = self.index.get(pdf_path)['page_sizes']
+        except Exception as e:
+            logger.warning(f"无法读取页面尺寸，跳过输出空间检查: {e}")
+            return None
+        estimate = estimate_output_bytes([page_sizes[page - 1] for page in pages], dpi,
+                                         format, encoding, self.size_model)
+        free = check_output_space(output_dir, estimate, self.disk_reserve, max_output_bytes)
+        if free is not None:
+            logger.info(f"预计输出 {format_file_size(estimate)}，"
+                        f"可用空间 {format_file_size(free)}")
+        return estimate
+    
+    def _learn_output_size(self, pdf_path, pages, dpi, format, encoding, stats):
+        """按本次实际写出的字节数更新压缩率模型；写出页数与渲染页数不符时不更新"""
+        snapshot = stats.snapshot()
+        if not pages or snapshot['pages'] != len(pages):
+            return
+        try:
+            page_sizes = self.index.get(pdf_path)['page_sizes']
+        except Exception:
+            return
+        raw_bytes = sum(estimate_raster_bytes(*page_sizes[page - 1], dpi) for page in pages)
+        self.size_model.observe(format, encoding, raw_bytes, snapshot['bytes_written'])
+    
+    def _resolve_pages(self, pdf_path, pages, timings=None):
+        """将页码参数解析为有序页码列表：None 为全部页面，字符串按页码选择语法解析"""
+        start = time.perf_counter()
+        page_count = self.get_page_count(pdf_path)
+        if timings is not None:
+            timings.observe('parse', time.perf_counter() - start)
+        if pages is None:
+            return list(range(1, page_count + 1))
+        if isinstance(pages, str):
+            return parse_page_selection(pages, page_count)
+        pages = sorted(set(pages))
+        invalid = [page for page in pages if not 1 <= page <= page_count]
+        if invalid:
+            raise ValueError(f"页码超出范围 (共 {page_count} 页): {invalid}")
+        return pages
+    
+    def _plan_memory(self, pdf_path, pages, dpi, memory_budget,
+                     chunk_size, workers, encoder_threads, tile_output=None):
+        """按内存预算调整渲染参数
+        
+        返回 ((chunk_size, workers, encoder_threads, queue_size), 需分块渲染的页码列表)。
+        """
+        unchanged = (chunk_size, workers, encoder_threads, None)
+        try:
+            page_sizes = self.index.get(pdf_path)['page_sizes']
+        except Exception as e:
+            logger.warning(f"无法读取页面尺寸，忽略内存预算: {e}")
+            return unchanged, []
+        
+        peaks = {page: estimate_page_peak(*page_sizes[page - 1], dpi) for page in pages}
+        oversized = [page for page in pages if peaks[page] > memory_budget]
+        if oversized and tile_output is None:
+            largest = max(oversized, key=peaks.get)
+            raise MemoryBudgetError(
+                f"第 {largest} 页在 {dpi} DPI 下约需 {format_file_size(peaks[largest])} 内存，"
+                f"超过预算 {format_file_size(memory_budget)}"
+            )
+        if oversized:
+            logger.info(f"{len(oversized)} 页超出内存预算，改为分块渲染")
+        
+        remaining = [page for page in pages if page not in oversized]
+        if not remaining:
+            return unchanged, oversized
+        largest = max(remaining, key=peaks.get)
+        plan = plan_for_budget(peaks[largest], memory_budget, chunk_size,
+                               workers, encoder_threads)
+        logger.info(f"内存预算 {format_file_size(memory_budget)}: 单页约 "
+                    f"{format_file_size(peaks[largest])}，窗口 {plan[0]} 页，"
+                    f"{plan[1]} 个进程，{plan[2]} 个编码线程")
+        return plan, oversized
+    
+    def _iter_tiled_pages(self, pdf_path, output_dir, output_prefix, dpi, format,
+                          pages, tile_output, memory_budget, workers):
+        """逐页分块渲染超出内存预算的页面，依次产出 (页码, 输出路径)"""
+        from tiled_render import render_page_tiled, tile_size_for_budget
+        
+        page_sizes = self.index.get(pdf_path)['page_sizes']
+        tile_size = tile_size_for_budget(memory_budget, workers)
+        for page_number in pages:
+            output_path = _tiled_output_path(output_dir, output_prefix, page_number,
+                                             tile_output)
+            yield page_number, render_page_tiled(
+                pdf_path, page_number, page_sizes[page_number - 1], dpi, output_path,
+                layout=tile_output, tile_size=tile_size, workers=workers,
+                tile_format=format
+            )
+    
+    def _render_parallel(self, job, windows, workers, direct=False,
+                         encoding=None, stats=None, timings=None):
+        """在进程池中并行渲染各窗口，并按页码顺序产出 (页码, 输出路径)
+        
+        设置了常驻进程池时提交到该进程池，每次转换最多有 workers*2 个窗口在途，
+        避免一个大文档占满进程池的队列；结束或中途停止时只取消本次提交的窗口。
+        """
+        from concurrent.futures import ProcessPoolExecutor, wait
+        
+        shared = self.process_pool is not None
+        if shared:
+            executor = self.process_pool
+            ahead = workers * 2
+        else:
+            executor = ProcessPoolExecutor(max_workers=min(workers, len(windows)))
+            ahead = len(windows)
+        pending = iter(windows)
+        futures = collections.deque()
+        
+        def submit_next():
+            window = next(pending, None)
+            if window is not None:
+                futures.append(executor.submit(_render_window, *job, *window, direct,
+                                               encoding, timings is not None))
+        
+        try:
+            for _ in range(ahead):
+                submit_next()
+            # 按提交顺序取结果，保证进度回调仍按页码递增
+            while futures:
+                pages, window_stats, window_timings = futures.popleft().result()
+                submit_next()
+                if stats is not None:
+                    stats.merge(window_stats)
+                if timings is not None:
+                    timings.merge(window_timings)
+                yield from pages
+        finally:
+            if shared:
+                for future in futures:
+                    future.cancel()
+                # 等待已开始的窗口结束，避免与之后的重试或清理同时写入输出目录
+                wait(futures)
+            else:
+                executor.shutdown(wait=True, cancel_futures=True)
+    
+    def batch_convert(self, pdf_files, output_dir, format='PNG', dpi=200,
+                      workers=None, progress_callback=None, resume=True,
+                      pages=None, memory_budget=None, encoding=None,
+                      max_output_bytes=None):
+        """批量转换多个PDF文件
+        
+        由 BatchScheduler 在有界线程池中并发执行，返回结果按输入顺序排列。
+        需要逐个获取已完成文件的结果或取消任务时，直接使用 BatchScheduler.run。
+        已完成的页面记录在 output_dir 下的清单中，resume 为 True 时跳过输入未变化的
+        已完成页面；为 False 时清空清单重新转换。pages 为应用于每个文件的页码选择，
+        memory_budget 为整批任务共享的内存上限（字节），encoding 为编码配置名。
+        预计输出放不下目标卷可用空间或 max_output_bytes 的文件不转换，记为失败。
+        """
+        from batch_scheduler import BatchScheduler
+        from manifest import ConversionManifest
+        
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = ConversionManifest.for_output_dir(output_dir, reset=not resume)
+        try:
+            scheduler = BatchScheduler(self, workers=workers, manifest=manifest,
+                                       memory_budget=memory_budget, encoding=encoding,
+                                       max_output_bytes=max_output_bytes)
+            results = [None] * len(pdf_files)
+            for index, result in scheduler.run(pdf_files, output_dir, format, dpi,
+                                               progress_callback, with_index=True,
+                                               pages=pages):
+                results[index] = result
+        finally:
+            manifest.close()
         
+        _log_encode_stats(scheduler.encode_stats)
         return results
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 内存中最多缓存的文档条目数
+DEFAULT_MAX_ENTRIES = 4096
+# 页面上最大图片的像素数达到页面在该DPI下像素数的一半时，视为扫描页
+SCAN_DETECT_DPI = 100
+
+
+def _page_size(page):
+    """返回页面显示尺寸 (宽, 高)，单位为点，已考虑 /Rotate"""
+    box = page.mediabox
+    width, height = float(box.width), float(box.height)
+    if int(page.get('/Rotate', 0) or 0) % 180:
+        width, height = height, width
+    return width, height
+
+
+def _is_scanned(page, width, height):
+    """页面是否主要由一张位图构成（扫描件）"""
+    resources = page.get('/Resources')
+    if resources is None:
+        return False
+    xobjects = resources.get_object().get('/XObject')
+    if xobjects is None:
+        return False
+
+    largest = 0
+    for ref in xobjects.get_object().values():
+        xobject = ref.get_object()
+        if xobject.get('/Subtype') == '/Image':
+            largest = max(largest, int(xobject.get('/Width', 0)) * int(xobject.get('/Height', 0)))
+    page_pixels = (width / 72 * SCAN_DETECT_DPI) * (height / 72 * SCAN_DETECT_DPI)
+    return largest >= page_pixels / 2
+
+
+def build_index_entry(pdf_path):
+    """解析一次PDF，返回页数、各页尺寸（点）、扫描页标记和文档信息"""
+    from PyPDF2 import PdfReader
+
+    with open(pdf_path, 'rb') as file:
+        reader = PdfReader(file)
+        page_sizes = []
+        scanned = []
+        for page in reader.pages:
+            width, height = _page_size(page)
+            page_sizes.append((width, height))
+            try:
+                scanned.append(_is_scanned(page, width, height))
+            except Exception:
+                scanned.append(False)
+
+        info = reader.metadata or {}
+        return {
+            'page_count': len(page_sizes),
+            'page_sizes': page_sizes,
+            'scanned': scanned,
+            'title': info.get('/Title', '未知标题'),
+            'author': info.get('/Author', '未知作者'),
+            'file_size': os.path.getsize(pdf_path),
+        }
+
+
+class DocumentIndex:
+    """PDF文档索引缓存
+
+    条目按 (绝对路径, 修改时间, 大小) 缓存，文件未变化时不再重新解析；
+    超过 max_entries 时淘汰最久未用的条目。
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pdf_path):
+        """返回文档索引条目，解析失败时抛出异常"""
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = build_index_entry(pdf_path)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def estimate_page_costs(entry, pages=None):
+    """估算各页的相对渲染成本：页面面积（平方英寸），扫描页加权
+
+    DPI对同一批任务中的所有页面相同，因此只需比较面积。
+    """
+    pages = pages or range(1, entry['page_count'] + 1)
+    costs = []
+    for page_number in pages:
+        width, height = entry['page_sizes'][page_number - 1]
+        cost = (width / 72) * (height / 72)
+        if entry['scanned'][page_number - 1]:
+            cost *= 1.5  # 扫描页需要解码大图，成本更高
+        costs.append(cost)
+    return costs
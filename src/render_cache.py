@@ -0,0 +1,189 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存容量上限：2GB
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+class RenderCache:
+    """按内容寻址的页面渲染缓存
+
+    键由PDF内容的SHA-256、页码、DPI和输出格式组成，与文件名和路径无关，
+    因此重新上传或改名的相同文件也能命中。命中时以硬链接（跨卷时复制）
+    的方式生成输出文件；总大小超过 max_bytes 时按最近最少使用淘汰。
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, use_hardlinks=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.use_hardlinks = use_hardlinks
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._hash_memo = {}  # (路径, 修改时间, 大小) -> 内容哈希
+
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"),
+                                   check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, path TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._total_bytes = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def document_hash(self, pdf_path):
+        """计算PDF内容的SHA-256，同一文件未变化时只计算一次"""
+        stat = os.stat(pdf_path)
+        memo_key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._hash_memo.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            with self._lock:
+                self._hash_memo[memo_key] = digest
+        return digest
+
+    @staticmethod
+    def page_key(document_hash, page_number, dpi, format, variant=''):
+        """生成单页缓存键；variant 用于区分其他影响输出的参数"""
+        key = f"{document_hash}:{page_number}:{dpi}:{format.upper()}"
+        return f"{key}:{variant}" if variant else key
+
+    def contains(self, key):
+        """缓存中是否有该键（不计入命中统计，也不更新最近使用时间）"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None and os.path.isfile(row[0])
+
+    def links_to(self, output_dir):
+        """命中时能否以硬链接在 output_dir 中生成输出文件，即不占用额外磁盘空间"""
+        if not self.use_hardlinks:
+            return False
+        try:
+            return os.stat(self.cache_dir).st_dev == os.stat(output_dir).st_dev
+        except OSError:
+            return False
+
+    def fetch(self, key, output_path):
+        """命中时在 output_path 生成缓存文件并返回 True，否则返回 False"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.isfile(row[0]):
+                if row is not None:
+                    # 缓存文件已被外部删除，清理索引
+                    self._remove_entry(key)
+                self.misses += 1
+                return False
+            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?",
+                             (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            cached_path = row[0]
+
+        # 链接到临时文件后再重命名，保证输出文件原子出现
+        temp_path = f"{output_path}.part"
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        self._link_or_copy(cached_path, temp_path)
+        os.replace(temp_path, output_path)
+        return True
+
+    def store(self, key, source_path):
+        """将已生成的输出文件加入缓存"""
+        ext = os.path.splitext(source_path)[1]
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        cached_path = os.path.join(self.cache_dir, "objects", name[:2], name + ext)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+
+        with self._lock:
+            if os.path.lexists(cached_path):
+                os.remove(cached_path)
+            self._link_or_copy(source_path, cached_path)
+            size = os.path.getsize(cached_path)
+
+            old = self._db.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._total_bytes -= old[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, path, size, last_used) "
+                "VALUES (?, ?, ?, ?)", (key, cached_path, size, time.time()))
+            self._total_bytes += size
+            self._evict()
+            self._db.commit()
+
+    def stats(self):
+        """返回命中/未命中/淘汰计数以及当前条目数和总大小"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': self._total_bytes,
+            }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for (path,) in self._db.execute("SELECT path FROM entries").fetchall():
+                if os.path.isfile(path):
+                    os.remove(path)
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _link_or_copy(self, source, target):
+        if self.use_hardlinks:
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass  # 跨卷或文件系统不支持硬链接时退回复制
+        shutil.copy2(source, target)
+
+    def _remove_entry(self, key):
+        row = self._db.execute(
+            "SELECT path, size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        path, size = row
+        if os.path.isfile(path):
+            os.remove(path)
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._total_bytes -= size
+
+    def _evict(self):
+        """按最近最少使用淘汰，直到总大小不超过上限（需持有锁）"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT key FROM entries ORDER BY last_used ASC").fetchall()
+        for (key,) in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove_entry(key)
+            self.evictions += 1
+        logger.info(f"渲染缓存已淘汰至 {self._total_bytes} 字节")
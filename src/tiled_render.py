@@ -0,0 +1,221 @@
+import io
+import os
+import math
+import json
+import zlib
+import struct
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+# 默认分块边长（像素），TIFF要求分块尺寸为16的倍数
+DEFAULT_TILE_SIZE = 2048
+MIN_TILE_SIZE = 256
+# 分块输出布局：直接写出分块图片目录，或拼接为分块TIFF
+TILE_LAYOUTS = ('tiles', 'tiff')
+
+
+def page_pixel_size(width_pt, height_pt, dpi):
+    """页面在指定DPI下的像素尺寸"""
+    return math.ceil(width_pt / 72 * dpi), math.ceil(height_pt / 72 * dpi)
+
+
+def tile_size_for_budget(memory_budget, workers, overhead=2):
+    """按内存预算选择分块边长：同时在途的分块（每个工作线程两块）不超过预算"""
+    pixels = memory_budget / (workers * 2 * 3 * overhead)
+    size = int(math.sqrt(pixels)) // 16 * 16
+    return max(MIN_TILE_SIZE, min(DEFAULT_TILE_SIZE, size))
+
+
+def render_tile(pdf_path, page_number, dpi, x, y, width, height):
+    """用pdftoppm的裁剪参数渲染页面的一个矩形区域，返回RGB图片"""
+    from PIL import Image
+
+    command = [
+        'pdftoppm', '-r', str(dpi), '-f', str(page_number), '-l', str(page_number),
+        '-x', str(x), '-y', str(y), '-W', str(width), '-H', str(height),
+        pdf_path,
+    ]
+    # 不指定输出文件名时pdftoppm将PPM写到标准输出
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"pdftoppm 渲染分块失败: "
+                           f"{result.stderr.decode(errors='replace').strip()}")
+    image = Image.open(io.BytesIO(result.stdout))
+    image.load()
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+class TiledTiffWriter:
+    """流式写出分块TIFF（RGB、Deflate压缩）
+
+    分块可按任意顺序写入，写完即丢弃，内存占用只与分块大小有关；
+    所有分块写完后在文件末尾写出IFD。使用经典TIFF格式，文件不能超过4GB。
+    """
+
+    def __init__(self, path, width, height, tile_size, dpi):
+        if tile_size % 16:
+            raise ValueError("TIFF分块尺寸必须是16的倍数")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.dpi = dpi
+        self.cols = math.ceil(width / tile_size)
+        self.rows = math.ceil(height / tile_size)
+        self._offsets = [0] * (self.rows * self.cols)
+        self._byte_counts = [0] * (self.rows * self.cols)
+        self._file = open(path, 'wb')
+        self._file.write(b'II*\x00' + struct.pack('<I', 0))  # IFD偏移稍后回填
+
+    def write_tile(self, row, col, image):
+        """写入一个分块；边缘分块不足 tile_size 时以白色补齐"""
+        from PIL import Image
+
+        if image.size != (self.tile_size, self.tile_size):
+            padded = Image.new('RGB', (self.tile_size, self.tile_size), 'white')
+            padded.paste(image, (0, 0))
+            image = padded
+        data = zlib.compress(image.tobytes(), 6)
+
+        offset = self._file.tell()
+        if offset + len(data) >= 2 ** 32:
+            raise OverflowError("分块TIFF超过4GB，请改用分块图片目录输出")
+        self._file.write(data)
+        if len(data) % 2:
+            self._file.write(b'\x00')  # 保持字对齐
+        index = row * self.cols + col
+        self._offsets[index] = offset
+        self._byte_counts[index] = len(data)
+
+    def close(self):
+        """写出IFD并关闭文件"""
+        f = self._file
+        tile_count = len(self._offsets)
+
+        # IFD引用的数组数据先写在IFD之前
+        extra = {}
+
+        def put_array(name, fmt, values):
+            extra[name] = f.tell()
+            f.write(struct.pack('<' + fmt * len(values), *values))
+
+        put_array('bits', 'H', [8, 8, 8])
+        put_array('xres', 'I', [self.dpi, 1])
+        put_array('yres', 'I', [self.dpi, 1])
+        if tile_count > 1:
+            put_array('offsets', 'I', self._offsets)
+            put_array('counts', 'I', self._byte_counts)
+        if f.tell() % 2:
+            f.write(b'\x00')
+
+        SHORT, LONG, RATIONAL = 3, 4, 5
+        entries = [
+            (256, LONG, 1, self.width),
+            (257, LONG, 1, self.height),
+            (258, SHORT, 3, extra['bits']),
+            (259, SHORT, 1, 8),           # Adobe Deflate
+            (262, SHORT, 1, 2),           # RGB
+            (277, SHORT, 1, 3),
+            (282, RATIONAL, 1, extra['xres']),
+            (283, RATIONAL, 1, extra['yres']),
+            (284, SHORT, 1, 1),           # 交错存储
+            (296, SHORT, 1, 2),           # 英寸
+            (322, LONG, 1, self.tile_size),
+            (323, LONG, 1, self.tile_size),
+            (324, LONG, tile_count, extra.get('offsets', self._offsets[0])),
+            (325, LONG, tile_count, extra.get('counts', self._byte_counts[0])),
+        ]
+        ifd_offset = f.tell()
+        f.write(struct.pack('<H', len(entries)))
+        for tag, field_type, count, value in entries:
+            if field_type == SHORT and count == 1:
+                f.write(struct.pack('<HHIHH', tag, field_type, count, value, 0))
+            else:
+                f.write(struct.pack('<HHII', tag, field_type, count, value))
+        f.write(struct.pack('<I', 0))
+
+        f.seek(4)
+        f.write(struct.pack('<I', ifd_offset))
+        f.close()
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def render_page_tiled(pdf_path, page_number, page_size_pt, dpi, output_path,
+                      layout='tiff', tile_size=DEFAULT_TILE_SIZE, workers=2,
+                      tile_format='PNG'):
+    """分块渲染单个超大页面，返回输出路径
+
+    layout 为 'tiff' 时拼接为 output_path 处的分块TIFF（不在内存中组装整页）；
+    为 'tiles' 时 output_path 是目录，分块按 {行}_{列}.{格式} 写出并附带 tiles.json。
+    多个分块在 workers 个线程中并行渲染（每个分块一个pdftoppm进程），
+    在途分块数有上限，峰值内存只取决于分块大小。
+    """
+    if layout not in TILE_LAYOUTS:
+        raise ValueError(f"不支持的分块布局: {layout}")
+    if layout == 'tiff':
+        tile_size = max(16, tile_size // 16 * 16)
+    width, height = page_pixel_size(*page_size_pt, dpi)
+    cols, rows = math.ceil(width / tile_size), math.ceil(height / tile_size)
+    logger.info(f"分块渲染第 {page_number} 页: {width}x{height} 像素，"
+                f"{rows}x{cols} 块，每块 {tile_size} 像素")
+
+    if layout == 'tiff':
+        temp_path = f"{output_path}.part"
+        writer = TiledTiffWriter(temp_path, width, height, tile_size, dpi)
+
+        def sink(row, col, image):
+            writer.write_tile(row, col, image)
+    else:
+        os.makedirs(output_path, exist_ok=True)
+
+        def sink(row, col, image):
+            tile_path = os.path.join(output_path, f"{row}_{col}.{tile_format.lower()}")
+            if tile_format.upper() == 'JPEG':
+                image = image.convert('RGB')
+            image.save(f"{tile_path}.part", format=tile_format)
+            os.replace(f"{tile_path}.part", tile_path)
+
+    tiles = [(row, col) for row in range(rows) for col in range(cols)]
+    tiles.reverse()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    in_flight = {}
+    try:
+        while tiles or in_flight:
+            while tiles and len(in_flight) < max(1, workers) * 2:
+                row, col = tiles.pop()
+                x, y = col * tile_size, row * tile_size
+                future = executor.submit(render_tile, pdf_path, page_number, dpi, x, y,
+                                         min(tile_size, width - x), min(tile_size, height - y))
+                in_flight[future] = (row, col)
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                row, col = in_flight.pop(future)
+                image = future.result()
+                sink(row, col, image)
+                image.close()
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if layout == 'tiff':
+            writer.abort()
+        raise
+    executor.shutdown(wait=True)
+
+    if layout == 'tiff':
+        writer.close()
+        os.replace(temp_path, output_path)
+    else:
+        with open(os.path.join(output_path, "tiles.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                'page': page_number, 'dpi': dpi, 'width': width, 'height': height,
+                'tile_size': tile_size, 'rows': rows, 'cols': cols,
+                'format': tile_format.upper(),
+                'tile_pattern': f"{{row}}_{{col}}.{tile_format.lower()}",
+            }, f, ensure_ascii=False, indent=2)
+    return output_path
@@ -1,9 +1,32 @@
 import os
+import json
+import math
 import shutil
+import logging
+import threading
 from pathlib import Path
+from memory_budget import estimate_raster_bytes
+
+logger = logging.getLogger(__name__)
+
+# 预检：写完预计输出后目标卷至少保留的可用空间
+DEFAULT_DISK_RESERVE = 256 * 1024 * 1024
+# 输出字节数估算的安全系数
+OUTPUT_SAFETY_FACTOR = 1.2
+# 没有历史数据时的压缩率（输出字节数 / 24位RGB位图字节数）
+DEFAULT_COMPRESSION_RATIOS = {'PNG': 0.3, 'JPEG': 0.08, 'BMP': 1.0, 'TIFF': 1.0}
+# 压缩率模型累计的位图字节数超过该值时减半，使模型跟随近期文档变化
+MODEL_HISTORY_BYTES = 64 * 1024 * 1024 * 1024
+
+class DiskSpaceError(Exception):
+    """预计输出超出目标卷可用空间或输出上限"""
 
 def validate_pdf_file(file_path):
-    """验证PDF文件是否有效"""
+    """验证PDF文件是否有效
+    
+    不限制PDF文件本身的大小：转换成本取决于页数、页面尺寸和DPI，由转换前的输出空间
+    预检（check_output_space）把关。
+    """
     if not os.path.isfile(file_path):
         return False, "文件不存在"
     
@@ -15,18 +38,98 @@ def validate_pdf_file(file_path):
     if file_size == 0:
         return False, "文件为空"
     
-    if file_size > 100 * 1024 * 1024:  # 100MB限制
-        return False, "文件过大（超过100MB）"
-    
     return True, "文件有效"
 
 def get_available_disk_space(path):
-    """获取指定路径的可用磁盘空间"""
+    """获取指定路径所在卷的可用磁盘空间，路径尚不存在时取最近的已存在上级目录；
+    无法获取时返回 None"""
+    path = Path(path).absolute()
+    while not path.exists() and path.parent != path:
+        path = path.parent
     try:
         total, used, free = shutil.disk_usage(path)
         return free
-    except:
-        return 0
+    except OSError:
+        return None
+
+def _model_key(format, encoding=None):
+    if encoding is None:
+        return format.upper()
+    return f"{format.upper()}/{encoding if isinstance(encoding, str) else 'custom'}"
+
+class CompressionModel:
+    """按格式和编码配置学习的压缩率模型（输出字节数 / 未压缩位图字节数）
+    
+    每次转换完成后由 observe() 记录实际写出的字节数；指定 path 时模型保存为JSON，
+    启动时读取、每次更新后原子写回。没有样本时使用 DEFAULT_COMPRESSION_RATIOS。
+    """
+    
+    def __init__(self, path=None):
+        self.path = path
+        self._samples = {}   # 格式[/编码配置] -> {'raw_bytes', 'output_bytes'}
+        self._lock = threading.Lock()
+        if path and os.path.isfile(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._samples = json.load(f)['samples']
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"压缩率模型读取失败，使用默认值: {e}")
+    
+    def ratio(self, format, encoding=None):
+        """返回该格式和编码配置的压缩率；编码配置没有样本时退回同格式的默认参数样本"""
+        with self._lock:
+            for key in (_model_key(format, encoding), _model_key(format)):
+                sample = self._samples.get(key)
+                if sample and sample['raw_bytes']:
+                    return sample['output_bytes'] / sample['raw_bytes']
+        return DEFAULT_COMPRESSION_RATIOS.get(format.upper(), 1.0)
+    
+    def observe(self, format, encoding, raw_bytes, output_bytes):
+        """记录一次转换的未压缩位图字节数和实际写出字节数"""
+        if raw_bytes <= 0:
+            return
+        key = _model_key(format, encoding)
+        with self._lock:
+            sample = self._samples.setdefault(key, {'raw_bytes': 0, 'output_bytes': 0})
+            sample['raw_bytes'] += raw_bytes
+            sample['output_bytes'] += output_bytes
+            if sample['raw_bytes'] > MODEL_HISTORY_BYTES:
+                sample['raw_bytes'] //= 2
+                sample['output_bytes'] //= 2
+            if self.path:
+                self._save()
+    
+    def _save(self):
+        temp_path = f"{self.path}.part"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'samples': self._samples}, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"压缩率模型保存失败: {e}")
+
+def estimate_output_bytes(page_sizes, dpi, format, encoding=None, model=None):
+    """由各页尺寸（点）、DPI、格式和压缩率估算输出总字节数（含安全系数）"""
+    raw_bytes = sum(estimate_raster_bytes(width, height, dpi) for width, height in page_sizes)
+    if model is not None:
+        ratio = model.ratio(format, encoding)
+    else:
+        ratio = DEFAULT_COMPRESSION_RATIOS.get(format.upper(), 1.0)
+    return math.ceil(raw_bytes * ratio * OUTPUT_SAFETY_FACTOR)
+
+def check_output_space(output_dir, estimate, reserve=DEFAULT_DISK_RESERVE,
+                       max_output_bytes=None):
+    """写出前检查：预计输出超过 max_output_bytes，或写完后目标卷可用空间低于 reserve 时
+    抛出 DiskSpaceError；返回当前可用空间，无法获取时返回 None（不做空间检查）"""
+    if max_output_bytes is not None and estimate > max_output_bytes:
+        raise DiskSpaceError(f"预计输出 {format_file_size(estimate)}，"
+                             f"超过上限 {format_file_size(max_output_bytes)}")
+    free = get_available_disk_space(output_dir)
+    if free is not None and estimate + reserve > free:
+        raise DiskSpaceError(f"磁盘空间不足: 预计输出 {format_file_size(estimate)}，"
+                             f"{output_dir} 所在卷可用 {format_file_size(free)}"
+                             f"（需保留 {format_file_size(reserve)}）")
+    return free
 
 def format_file_size(size_bytes):
     """格式化文件大小显示"""
@@ -34,4 +137,54 @@ def format_file_size(size_bytes):
         if size_bytes < 1024.0:
             return f"{size_bytes:.2f} {unit}"
         size_bytes /= 1024.0
-    return f"{size_bytes:.2f} TB"
\ No newline at end of file
+    return f"{size_bytes:.2f} TB"
+
+def _parse_page_tokens(spec):
+    """将页码选择拆分为 (起始页, 结束页) 列表，None 表示最后一页"""
+    def parse_page(token):
+        if token == 'last':
+            return None
+        page = int(token)
+        if page < 1:
+            raise ValueError
+        return page
+    
+    ranges = []
+    for part in spec.replace(' ', '').lower().split(','):
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                start, end = part.split('-', 1)
+                start = parse_page(start)
+                end = parse_page(end) if end else None  # "3-" 表示到最后一页
+            else:
+                start = end = parse_page(part)
+        except ValueError:
+            raise ValueError(f"无效的页码范围: {part}")
+        if start is None and end is not None:
+            raise ValueError(f"无效的页码范围: {part}")
+        if start is not None and end is not None and end < start:
+            raise ValueError(f"无效的页码范围: {part}")
+        ranges.append((start, end))
+    if not ranges:
+        raise ValueError(f"未指定任何页码: {spec}")
+    return ranges
+
+def validate_page_selection(spec):
+    """检查页码选择的语法，无效时抛出 ValueError"""
+    _parse_page_tokens(spec)
+
+def parse_page_selection(spec, page_count):
+    """解析页码选择，如 "1"、"1-5,9"、"last"、"3-last"、"3-"，返回升序去重的页码列表
+    
+    超出文档页数的部分被忽略，没有任何有效页码时抛出 ValueError。
+    """
+    pages = set()
+    for start, end in _parse_page_tokens(spec):
+        start = page_count if start is None else start
+        end = page_count if end is None else min(end, page_count)
+        pages.update(range(start, end + 1))
+    if not pages:
+        raise ValueError(f"页码选择 {spec} 超出文档范围 (共 {page_count} 页)")
+    return sorted(pages)
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 源码为 src 下的平铺模块，与 benchmarks 相同直接加入导入路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
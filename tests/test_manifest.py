@@ -0,0 +1,54 @@
+import json
+
+from manifest import ConversionManifest
+
+
+def _make_pages(tmp_path):
+    pdf_path = tmp_path / "a.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4\n")
+    output_path = tmp_path / "a_page_001.png"
+    output_path.write_bytes(b"png")
+    return str(pdf_path), str(output_path)
+
+
+def test_completed_pages_keyed_by_encoding(tmp_path):
+    pdf_path, output_path = _make_pages(tmp_path)
+    manifest = ConversionManifest.for_output_dir(str(tmp_path))
+    manifest.record_page(pdf_path, 1, output_path, 200, 'png')
+
+    assert manifest.completed_pages(pdf_path, 200, 'PNG') == {1: output_path}
+    assert manifest.completed_pages(pdf_path, 200, 'PNG', 'smallest') == {}
+    assert manifest.completed_pages(pdf_path, 300, 'PNG') == {}
+    manifest.close()
+
+
+def test_encoding_survives_reload(tmp_path):
+    pdf_path, output_path = _make_pages(tmp_path)
+    manifest = ConversionManifest.for_output_dir(str(tmp_path))
+    manifest.record_page(pdf_path, 1, output_path, 200, 'PNG', 'smallest')
+    manifest.close()
+
+    reloaded = ConversionManifest.for_output_dir(str(tmp_path))
+    assert reloaded.completed_pages(pdf_path, 200, 'PNG', 'smallest') == {1: output_path}
+    assert reloaded.completed_pages(pdf_path, 200, 'PNG') == {}
+    assert reloaded.completed_pages(pdf_path, 200, 'PNG', {'PNG': {}}) == {}
+    reloaded.close()
+
+
+def test_records_without_encoding_match_default(tmp_path):
+    pdf_path, output_path = _make_pages(tmp_path)
+    manifest = ConversionManifest.for_output_dir(str(tmp_path))
+    manifest.record_page(pdf_path, 1, output_path, 200, 'PNG')
+    manifest.close()
+
+    # 加入编码配置之前写出的清单记录没有 encoding 字段
+    with open(manifest.path, encoding='utf-8') as f:
+        record = json.loads(f.readline())
+    del record['encoding']
+    with open(manifest.path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(record) + "\n")
+
+    reloaded = ConversionManifest.for_output_dir(str(tmp_path))
+    assert reloaded.completed_pages(pdf_path, 200, 'PNG') == {1: output_path}
+    assert reloaded.completed_pages(pdf_path, 200, 'PNG', 'fast') == {}
+    reloaded.close()